@@ -5,19 +5,28 @@ Copyright (c) 2025 Xpander, Inc. All rights reserved.
 """
 
 import asyncio
-import inspect
+import contextvars
+import functools
+import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from os import getenv
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 from loguru import logger
 from xpander_sdk import (
     Agent, LLMProvider,
     ToolCallResult, MemoryStrategy, LLMTokens,
     Tokens
 )
-from local_tools import local_tools_by_name, local_tools_list
+from local_tools import LOCAL_TOOL_IDEMPOTENT, LOCAL_TOOL_PARAMS, local_tools_by_name, local_tools_list
 import sandbox
-from llm_providers import AsyncBedrockProvider, AsyncOpenAIProvider
+from llm_providers import (
+    AsyncOpenAIProvider,
+    canonical_json,
+    current_bedrock_provider,
+    get_bedrock_provider,
+)
 from dotenv import load_dotenv
 import logging
 
@@ -26,9 +35,102 @@ load_dotenv()
 logging.basicConfig()
 logging.getLogger().setLevel(logging.WARN)
 
+
+def configure_logging() -> None:
+    """
+    Replace loguru's default sink with the one the entry points log through.
+
+    A single stderr sink at LOG_LEVEL (default "INFO"); enqueue=True hands
+    records to a writer thread so log I/O never blocks the event loop. Called
+    by main.py and xpander_handler.py rather than at import, so embedding
+    hosts keep their own sinks.
+    """
+    logger.remove()
+    logger.add(sys.stderr, enqueue=True, level=getenv("LOG_LEVEL", "INFO"))
+
+
 MAXIMUM_STEPS_SOFT_LIMIT = int(getenv("MAXIMUM_STEPS_SOFT_LIMIT", 3))
 MAXIMUM_STEPS_HARD_LIMIT = int(getenv("MAXIMUM_STEPS_HARD_LIMIT", 4))
 
+# Tool payload keys holding paths that must be resolved inside the sandbox
+_PATH_KEYS: frozenset = frozenset({"filepath", "directory", "target_dir", "cwd"})
+
+_FINISH_TOOL_NAME = "xpfinish-agent-execution-finished"
+_SEP = "-" * 80
+
+# xpander-sdk talks to a single jsii Node process over an unlocked stdin/stdout
+# pipe, so concurrent SDK calls can read each other's replies. Every SDK call,
+# including property reads on SDK objects, holds this lock, across all
+# CodingAgent instances in the process
+SDK_LOCK = threading.Lock()
+
+# (function name, tool call ID, payload, is_success, result) of a local tool
+# call, kept as plain data so tools run without touching SDK objects
+LocalToolOutcome = Tuple[str, str, Dict, bool, Dict]
+
+
+def _tool_call_results(outcomes: List[LocalToolOutcome]) -> List[ToolCallResult]:
+    """
+    Build SDK tool call results from local tool outcomes.
+
+    Must run under SDK_LOCK.
+
+    Args:
+        outcomes (List[LocalToolOutcome]): Outcomes of executed local tools.
+
+    Returns:
+        List[ToolCallResult]: One result per outcome, in the same order.
+    """
+    results = []
+    for name, tool_call_id, payload, is_success, result in outcomes:
+        tool_call_result = ToolCallResult(
+            function_name=name,
+            tool_call_id=tool_call_id,
+            payload=payload,
+        )
+        tool_call_result.is_success = is_success
+        tool_call_result.result = result
+        results.append(tool_call_result)
+    return results
+
+
+def _cloud_result_summaries(tool_call_results: List, local_tool_calls: List) -> List[tuple]:
+    """
+    Summarize the results of tool calls that were not local.
+
+    Must run under SDK_LOCK.
+
+    Args:
+        tool_call_results (List): Results returned by `Agent.run_tools`.
+        local_tool_calls (List): Pending local tool calls of the same step.
+
+    Returns:
+        List[tuple]: (is_success, function_name) per cloud tool result.
+    """
+    local_ids = {t.tool_call_id for t in local_tool_calls}
+    return [
+        (res.is_success, res.function_name)
+        for res in tool_call_results
+        if res.tool_call_id not in local_ids
+    ]
+
+
+def _tool_name(tool: Dict) -> Optional[str]:
+    """
+    Return a tool schema's name, whichever provider format it is in.
+
+    Args:
+        tool (Dict): Tool schema as returned by `Agent.get_tools()`.
+
+    Returns:
+        Optional[str]: The tool name, if present.
+    """
+    return (
+        tool.get("name")
+        or tool.get("function", {}).get("name")
+        or tool.get("toolSpec", {}).get("name")
+    )
+
 # Provider to use. Default OpenAI
 llm_provider = LLMProvider.OPEN_AI
 
@@ -51,17 +153,85 @@ class CodingAgent:
         self.agent = agent
         self.llm_provider = llm_provider
 
-        self.agent.memory_strategy = MemoryStrategy.MOVING_WINDOW
-        self.agent.add_local_tools(local_tools_list)
-        self.agent.select_llm_provider(llm_provider)
+        with SDK_LOCK:
+            self.agent.memory_strategy = MemoryStrategy.MOVING_WINDOW
+            self.agent.add_local_tools(local_tools_list)
+            self.agent.select_llm_provider(llm_provider)
+
+            # Tool schemas are fixed once local tools and the provider are set
+            self._tools = self.agent.get_tools()
+        self._finish_only_tools = [t for t in self._tools if _tool_name(t) == _FINISH_TOOL_NAME]
+
+        # One persistent, bounded pool for every blocking hop (SDK calls and local tools)
+        self._pool = ThreadPoolExecutor(
+            max_workers=int(getenv("AGENT_TOOL_POOL", min(32, len(local_tools_list) + 4))),
+            thread_name_prefix="agent",
+        )
 
         if llm_provider == LLMProvider.AMAZON_BEDROCK:
-            self.model_endpoint = AsyncBedrockProvider()
+            self.model_endpoint = get_bedrock_provider()
         elif llm_provider == LLMProvider.OPEN_AI:
             self.model_endpoint = AsyncOpenAIProvider()
         else:
             raise KeyError(f"LLM Provider {llm_provider} is not supported in this coding agent")
 
+        # A provider shared through `bedrock_provider_scope` is owned by the scope
+        self._owns_model_endpoint = self.model_endpoint is not current_bedrock_provider()
+
+    async def startup(self) -> None:
+        """
+        Open the model endpoint's long-lived client ahead of the first step.
+        """
+        if self._owns_model_endpoint:
+            await self.model_endpoint.startup()
+
+    async def aclose(self) -> None:
+        """
+        Shut down the agent's thread pool and release the model endpoint's client.
+        """
+        self._pool.shutdown(wait=False)
+        if self._owns_model_endpoint:
+            await self.model_endpoint.aclose()
+
+    def _in_pool(self, fn, *args, **kwargs) -> asyncio.Future:
+        """
+        Run a blocking callable on the agent's thread pool.
+
+        The caller's context is copied into the worker, so tools see the
+        sandbox this execution resolved.
+
+        Args:
+            fn: Callable to run.
+            *args: Positional arguments for `fn`.
+            **kwargs: Keyword arguments for `fn`.
+
+        Returns:
+            asyncio.Future: Awaitable resolving to the callable's return value.
+        """
+        return asyncio.get_running_loop().run_in_executor(
+            self._pool,
+            contextvars.copy_context().run,
+            functools.partial(fn, *args, **kwargs),
+        )
+
+    def _in_sdk(self, fn, *args, **kwargs) -> asyncio.Future:
+        """
+        Run a blocking xpander SDK call on the agent's thread pool, one at a time.
+
+        Args:
+            fn: SDK callable to run.
+            *args: Positional arguments for `fn`.
+            **kwargs: Keyword arguments for `fn`.
+
+        Returns:
+            asyncio.Future: Awaitable resolving to the callable's return value.
+        """
+        def locked():
+            with SDK_LOCK:
+                return fn(*args, **kwargs)
+
+        return self._in_pool(locked)
+
     async def chat(self, user_input: str, thread_id: Optional[str] = None) -> str:
         """
         Public entry point for chat interaction.
@@ -76,18 +246,21 @@ class CodingAgent:
             str: The memory thread ID of the resulting agent run.
         """
         if thread_id:
-            logger.info(f"🧠 Adding task to existing thread: {thread_id}")
-            self.agent.add_task(input=user_input, thread_id=thread_id)
+            logger.info("🧠 Adding task to existing thread: {}", thread_id)
+            await self._in_sdk(self.agent.add_task, input=user_input, thread_id=thread_id)
         else:
             logger.info("🧠 Adding task to a new thread")
-            self.agent.add_task(input=user_input)
+            await self._in_sdk(self.agent.add_task, input=user_input)
 
         agent_thread = await self._agent_loop()
-        logger.info("-" * 80)
-        logger.info(f"🤖 Agent response: {agent_thread.result}")
-        return agent_thread.memory_thread_id
+        result, memory_thread_id = await self._in_sdk(
+            lambda: (agent_thread.result, agent_thread.memory_thread_id)
+        )
+        logger.info(_SEP)
+        logger.info("🤖 Agent response: {}", result)
+        return memory_thread_id
 
-    async def _call_model(self, tools: Optional[List[Dict]] = []) -> Dict[str, Any]:
+    async def _call_model(self, tools: Optional[List[Dict]] = None) -> Dict[str, Any]:
         """
         Internal helper to call the model endpoint.
 
@@ -97,12 +270,22 @@ class CodingAgent:
         Returns:
             Dict[str, Any]: Model response or error.
         """
+        agent = self.agent
+        messages, system_message, tool_choice, thread_id = await self._in_sdk(
+            lambda: (
+                agent.messages,
+                agent.memory.system_message,
+                agent.tool_choice,
+                agent.execution.memory_thread_id,
+            )
+        )
         return await self.model_endpoint.invoke_model(
-            messages=self.agent.messages,
-            system_message=self.agent.memory.system_message,
+            messages=messages,
+            system_message=system_message,
             temperature=0.0,
             tools=tools,
-            tool_choice=self.agent.tool_choice,
+            tool_choice=tool_choice,
+            prompt_cache_key=thread_id,
         )
 
     async def _agent_loop(self):
@@ -115,179 +298,246 @@ class CodingAgent:
         step = 1
         logger.info("🪄 Starting Agent Loop")
         execution_tokens = Tokens(worker=LLMTokens(0, 0, 0))
-        execution_start_time = time.perf_counter()
+        cached_tokens = 0
+        execution_start_time = time.perf_counter_ns()
 
-        while not self.agent.is_finished():
-            sandbox.get_sandbox(self.agent.execution.memory_thread_id)
+        # Bind per-step lookups once; the execution (and its thread) is fixed for this run
+        agent = self.agent
+        endpoint = self.model_endpoint
+        thread_id = await self._in_sdk(lambda: agent.execution.memory_thread_id)
 
-            tools, reached_limit = self.has_step_limit_been_hit(step=step)
-            if reached_limit:
-                break
+        while not await self._in_sdk(agent.is_finished):
+            sandbox.get_sandbox(thread_id)
+
+            if step <= MAXIMUM_STEPS_SOFT_LIMIT:
+                tools = self._tools
+            else:
+                tools, reached_limit = await self._handle_step_overflow(step=step)
+                if reached_limit:
+                    break
 
-            logger.info("-" * 80)
-            logger.info(f"🔍 Step {step}")
+            logger.info(_SEP)
+            logger.info("🔍 Step {}", step)
 
             response = await self._call_model(tools=tools)
 
-            if (
-                self.llm_provider == LLMProvider.AMAZON_BEDROCK
-                and self.model_endpoint.should_stop_running(response=response)
-            ):
-                self.agent.stop_execution(is_success=False, result=response["result"])
+            if endpoint.should_stop_running(response=response):
+                await self._in_sdk(agent.stop_execution, is_success=False, result=response["result"])
                 break
 
-            step_usage = self.model_endpoint.handle_token_accounting(
+            step_usage = endpoint.handle_token_accounting(
                 execution_tokens=execution_tokens,
                 response=response,
             )
+            step_cached = endpoint.cached_prompt_tokens(response)
+            cached_tokens += step_cached
 
-            llm_response = response.model_dump() if not isinstance(response, dict) else response
-            self.agent.add_messages(llm_response)
+            # Providers return plain dicts, which is the form the SDK consumes
+            llm_response = response
+            tool_calls = await self._in_sdk(agent.extract_tool_calls, llm_response=llm_response)
 
-            self.agent.report_execution_metrics(
+            await self._in_sdk(agent.add_messages, llm_response)
+            await self._in_sdk(
+                agent.report_execution_metrics,
                 llm_tokens=execution_tokens,
-                ai_model=self.model_endpoint.model_id,
+                ai_model=endpoint.model_id,
             )
 
-            tool_calls = self.agent.extract_tool_calls(llm_response=llm_response)
-
-            cloud_tool_call_results = await asyncio.to_thread(
-                self.agent.run_tools,
+            # Strictly sequential: run_tools runs the graph check that sets
+            # graphApproved on local calls, and retrieve_pending_local_tool_calls
+            # only returns approved ones, so discovery must wait for it to return
+            tool_call_results = await self._in_sdk(agent.run_tools, tool_calls=tool_calls)
+            local_tool_calls = await self._in_sdk(
+                agent.retrieve_pending_local_tool_calls,
                 tool_calls=tool_calls,
             )
-
-            local_tool_calls = await asyncio.to_thread(
-                self.agent.retrieve_pending_local_tool_calls,
-                tool_calls=tool_calls,
+            cloud_results = await self._in_sdk(
+                _cloud_result_summaries, tool_call_results, local_tool_calls
             )
-            cloud_tool_call_results[:] = [
-                c for c in cloud_tool_call_results
-                if c.tool_call_id not in {t.tool_call_id for t in local_tool_calls}
-            ]
-
-            local_tool_call_results = await self._execute_local_tools(local_tool_calls)
 
-            if local_tool_call_results:
-                self.agent.memory.add_tool_call_results(
-                    tool_call_results=local_tool_call_results,
+            # No SDK call is in flight here; only the sandbox tool bodies overlap
+            local_outcomes = await self._execute_local_tools(local_tool_calls)
+            if local_outcomes:
+                await self._in_sdk(
+                    lambda: agent.memory.add_tool_call_results(
+                        tool_call_results=_tool_call_results(local_outcomes)
+                    )
                 )
 
-            for res in cloud_tool_call_results + local_tool_call_results:
-                emoji = "✅" if res.is_success else "❌"
-                logger.info(f"{emoji} {res.function_name}")
+            # Local results were logged as each tool finished
+            for is_success, function_name in cloud_results:
+                emoji = "✅" if is_success else "❌"
+                logger.info("{} {}", emoji, function_name)
 
             logger.info(
-                f"🔢 Step {step} tokens used: {step_usage.total_tokens} "
-                f"(output: {step_usage.completion_tokens}, input: {step_usage.prompt_tokens})"
+                "🔢 Step {} tokens used: {} (output: {}, input: {}, cached: {})",
+                step,
+                step_usage.total_tokens,
+                step_usage.completion_tokens,
+                step_usage.prompt_tokens,
+                step_cached,
             )
             step += 1
 
+        totals = execution_tokens.worker
         logger.info(
-            f"✨ Execution duration: {time.perf_counter() - execution_start_time:.2f} s"
-        )
-        logger.info(
-            f"🔢 Total tokens used: {execution_tokens.worker.total_tokens} "
-            f"(output: {execution_tokens.worker.completion_tokens}, "
-            f"input: {execution_tokens.worker.prompt_tokens})"
+            "✨ Execution duration: {:.2f} s | 🔢 Total tokens used: {} "
+            "(output: {}, input: {}, cached: {} / {} = {:.0%} hit rate)",
+            (time.perf_counter_ns() - execution_start_time) / 1e9,
+            totals.total_tokens,
+            totals.completion_tokens,
+            totals.prompt_tokens,
+            cached_tokens,
+            totals.prompt_tokens,
+            cached_tokens / totals.prompt_tokens if totals.prompt_tokens else 0.0,
         )
 
-        sandbox.sandboxes[self.agent.execution.memory_thread_id] = sandbox.current_sandbox
-        return self.agent.retrieve_execution_result()
+        sandbox.sandboxes[thread_id] = sandbox.get_current_sandbox()
+        return await self._in_sdk(agent.retrieve_execution_result)
 
-    async def _execute_local_tools(self, local_tool_calls: List) -> List[ToolCallResult]:
+    async def _execute_local_tools(self, local_tool_calls: List) -> List[LocalToolOutcome]:
         """
         Execute multiple local tools concurrently in thread pool.
 
+        The calls' fields are read from the SDK once up front, so the tools run
+        on plain data; the caller turns the outcomes into SDK results and writes
+        them to the agent memory in one SDK call once every tool has finished.
+
         Args:
             local_tool_calls (List): List of local tool calls to run.
 
         Returns:
-            List[ToolCallResult]: Results of executed local tools.
+            List[LocalToolOutcome]: Outcomes of executed local tools, in completion order.
         """
         if not local_tool_calls:
             return []
 
-        start = time.time()
-        results = await asyncio.gather(
-            *(self._execute_local_tool(t) for t in local_tool_calls)
+        start = time.monotonic_ns()
+        calls = await self._in_sdk(
+            lambda: [(t.name, t.tool_call_id, t.payload) for t in local_tool_calls]
         )
-        if len(results) > 1:
-            logger.info(f"⚙️ Executed {len(results)} local tools in {time.time() - start:.2f} s")
-        return results
 
-    async def _execute_local_tool(self, tool) -> ToolCallResult:
+        # Identical calls to read-only tools in the same step share one execution
+        runs: Dict[tuple, asyncio.Future] = {}
+        pending = []
+        for name, tool_call_id, payload in calls:
+            key = (name, canonical_json(payload))
+            run = runs.get(key) if name in LOCAL_TOOL_IDEMPOTENT else None
+            if run is None:
+                run = asyncio.ensure_future(self._execute_local_tool(name, payload))
+                if name in LOCAL_TOOL_IDEMPOTENT:
+                    runs[key] = run
+            pending.append(self._local_tool_outcome(run, name, tool_call_id, payload))
+
+        outcomes = []
+        for next_outcome in asyncio.as_completed(pending):
+            outcome = await next_outcome
+            outcomes.append(outcome)
+            logger.info("{} {}", "✅" if outcome[3] else "❌", outcome[0])
+
+        if len(outcomes) > 1:
+            logger.opt(lazy=True).info(
+                "⚙️ Executed {} local tools in {:.2f} s",
+                lambda: len(outcomes),
+                lambda: (time.monotonic_ns() - start) / 1e9,
+            )
+        return outcomes
+
+    @staticmethod
+    async def _local_tool_outcome(
+        run: asyncio.Future, name: str, tool_call_id: str, payload: Dict
+    ) -> LocalToolOutcome:
+        """
+        Pair a (possibly shared) tool execution with the call it answers.
+
+        Args:
+            run (asyncio.Future): Pending execution of the call, or of an identical one.
+            name (str): Tool name.
+            tool_call_id (str): ID of the call to answer.
+            payload (Dict): Payload of the call.
+
+        Returns:
+            LocalToolOutcome: The execution's result under this call's tool_call_id.
+        """
+        is_success, result = await run
+        return name, tool_call_id, payload, is_success, result
+
+    async def _execute_local_tool(self, name: str, payload: Dict) -> Tuple[bool, Dict]:
         """
         Execute a single local tool in a background thread.
 
         Args:
-            tool: Tool object to be executed.
+            name (str): Tool name.
+            payload (Dict): Payload generated by the LLM.
 
         Returns:
-            ToolCallResult: Result object with success flag and output payload.
+            Tuple[bool, Dict]: Success flag and output payload.
         """
-        tool_start_time = time.time()
+        tool_start_time = time.monotonic_ns()
         logger.info(
-            f"🔦 LLM Requesting local tool: {tool.name} "
-            f"with generated payload: {tool.payload}"
-        )
-
-        tool_call_result = ToolCallResult(
-            function_name=tool.name,
-            tool_call_id=tool.tool_call_id,
-            payload=tool.payload,
+            "🔦 LLM Requesting local tool: {} with generated payload: {}",
+            name,
+            payload,
         )
 
-        def _run_tool():
-            original_func = local_tools_by_name.get(tool.name)
+        try:
+            original_func = local_tools_by_name.get(name)
             if not original_func:
-                raise ValueError(f"Tool {tool.name} not found")
-
-            params = {
-                k: sandbox.get_sandbox(filepath=v)
-                if k in {"filepath", "directory", "target_dir", "cwd"} and isinstance(v, str)
-                else v
-                for k, v in tool.payload.items()
-            }
-
-            sig = inspect.signature(original_func)
-            invalid = [k for k in params if k not in sig.parameters]
+                raise ValueError(f"Tool {name} not found")
+
+            # Same keys as local_tools_by_name, so every found tool has an entry
+            valid = LOCAL_TOOL_PARAMS[name]
+            params, invalid = {}, []
+            for k, v in payload.items():
+                if k not in valid:
+                    invalid.append(k)
+                elif k in _PATH_KEYS and isinstance(v, str):
+                    params[k] = sandbox.get_sandbox(filepath=v)
+                else:
+                    params[k] = v
             if invalid:
-                return False, {
+                is_ok, result_dict = False, {
                     "success": False,
-                    "message": f"Invalid parameters for {tool.name}: {', '.join(invalid)}",
+                    "message": f"Invalid parameters for {name}: {', '.join(invalid)}",
                     "invalid_params": invalid,
                 }
+            else:
+                is_ok = True
+                result_dict = await self._in_pool(original_func, **params)
 
-            return True, original_func(**params)
-
-        try:
-            is_ok, result_dict = await asyncio.to_thread(_run_tool)
-            tool_call_result.is_success = result_dict.get("success", is_ok)
-            tool_call_result.result = result_dict
+            is_success, result = result_dict.get("success", is_ok), result_dict
         except Exception as exc:
-            import traceback
-
-            logger.error(f"❌ Error executing tool {tool.name}: {exc}")
-            logger.critical("Traceback:", traceback.format_exc())
-            tool_call_result.is_success = False
-            tool_call_result.result = {
+            logger.exception("❌ Error executing tool {}: {}", name, exc)
+            is_success, result = False, {
                 "success": False,
-                "message": f"Error executing {tool.name}: {exc}",
+                "message": f"Error executing {name}: {exc}",
                 "error": str(exc),
             }
 
-        logger.info(f"🔧 Tool {tool.name} completed in {time.time() - tool_start_time:.2f} s")
-        return tool_call_result
+        logger.opt(lazy=True).debug(
+            "🔧 Tool {} completed in {:.2f} s",
+            lambda: name,
+            lambda: (time.monotonic_ns() - tool_start_time) / 1e9,
+        )
+        return is_success, result
     
     
-    def has_step_limit_been_hit(self, step: int) -> tuple[List[Dict], bool]:
-        tools = self.agent.get_tools()
-        
-        reached_limit = False
+    async def _handle_step_overflow(self, step: int) -> tuple[List[Dict], bool]:
+        """
+        Steer the agent to finish once the soft step limit is exceeded.
 
-        if step > MAXIMUM_STEPS_SOFT_LIMIT:
+        Args:
+            step (int): Current step number (above MAXIMUM_STEPS_SOFT_LIMIT).
+
+        Returns:
+            tuple[List[Dict], bool]: Tools restricted to the finish tool, and whether
+            the hard limit was reached and execution stopped.
+        """
+        # Ask only on the first step past the limit; repeating it bloats the prompt
+        # and breaks the cached prefix every following step
+        if step == MAXIMUM_STEPS_SOFT_LIMIT + 1:
             logger.error("🔴 Step limit reached → asking agent to wrap up")
-            self.agent.add_messages([
+            await self._in_sdk(self.agent.add_messages, [
                 {
                     "role": "user",
                     "content": (
@@ -297,21 +547,19 @@ class CodingAgent:
                     ),
                 }
             ])
-            tools = [
-                t for t in tools
-                if t.get("name", t.get("toolSpec", {}).get("name")) == "xpfinish-agent-execution-finished"
-            ]
-
-            if step > MAXIMUM_STEPS_HARD_LIMIT:
-                logger.error("🔴 Hard limit reached → force finish")
-                self.agent.stop_execution(
-                    is_success=False,
-                    result=(
-                        "This request was terminated automatically after "
-                        "reaching the agent's maximum step limit. "
-                        "Try breaking it into smaller, more focused requests."
-                    )
+
+        reached_limit = False
+        if step > MAXIMUM_STEPS_HARD_LIMIT:
+            logger.error("🔴 Hard limit reached → force finish")
+            await self._in_sdk(
+                self.agent.stop_execution,
+                is_success=False,
+                result=(
+                    "This request was terminated automatically after "
+                    "reaching the agent's maximum step limit. "
+                    "Try breaking it into smaller, more focused requests."
                 )
-                reached_limit = True
-        
-        return tools, reached_limit
+            )
+            reached_limit = True
+
+        return self._finish_only_tools, reached_limit
@@ -1,2 +1,8 @@
-from .bedrock import AsyncBedrockProvider
-from .openai import AsyncOpenAIProvider
\ No newline at end of file
+from .bedrock import (
+    AsyncBedrockProvider,
+    bedrock_provider_scope,
+    current_bedrock_provider,
+    get_bedrock_provider,
+)
+from .base import canonical_json
+from .openai import AsyncOpenAIProvider
@@ -1,6 +1,106 @@
-from typing import Any, Dict
+import hashlib
+import json
+from os import getenv
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
 from xpander_sdk import LLMTokens, Tokens
 
+try:
+    import orjson
+except ImportError:  # Optional C accelerator → fall back to the stdlib encoder
+    orjson = None
+
+
+def canonical_json(obj: Any) -> bytes:
+    """
+    Serialize an object to key-sorted JSON for hashing and comparison.
+
+    Uses orjson when it is installed, since this runs over whole conversations
+    on every step; non-JSON values are stringified either way.
+
+    Args:
+        obj (Any): Object to serialize.
+
+    Returns:
+        bytes: UTF-8 encoded JSON with sorted keys.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, default=str, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, sort_keys=True, default=str).encode()
+
+
+load_dotenv()
+
+# Appended to the system message by every provider
+AI_SAFETY = (
+    f"If you have reached the maximum number of steps "
+    f"({getenv('MAXIMUM_STEPS_SOFT_LIMIT')}), you must immediately "
+    f"call xpfinish-agent-execution-finished with the final result "
+    f"to complete this task, and provide useful feedback to the user "
+    f"about your progress and suggestions on how to call you again "
+    f"with a smaller task. Do nothing else."
+)
+
+# User-facing messages for model invocation failures
+GENERIC_ERROR = "An error occurred while invoking the model. Please try again later."
+RATE_LIMITED_ERROR = "The model is rate limited right now. Please try again shortly."
+TIMEOUT_ERROR = "The model took too long to respond. Please try again later."
+
+# Tool results shorter than this cost less to resend than to replace with a stub
+_MIN_ELIDED_RESULT_CHARS = 512
+
+# (position within the message, tool call ID, serialized result body)
+ToolResultRef = Tuple[int, Optional[str], bytes]
+
+
+def elide_duplicate_tool_results(
+    messages: List[Dict[str, Any]],
+    tool_results: Callable[[Dict[str, Any]], List[ToolResultRef]],
+    replace_result: Callable[[Dict[str, Any], int, str], Dict[str, Any]],
+) -> List[Dict[str, Any]]:
+    """
+    Replace repeated copies of identical tool results with a short stub.
+
+    Duplicates are only matched within one turn (everything after a user
+    message that carries no tool results), and the first copy is kept
+    verbatim. Whether a result is elided therefore depends only on the
+    messages before it, so the rewritten history is a stable prefix that
+    prompt caching can reuse from step to step. The input list and its
+    messages are never mutated; changed messages are rebuilt.
+
+    Args:
+        messages (List[Dict[str, Any]]): Provider-format conversation messages.
+        tool_results (Callable): Returns the tool results carried by a message.
+        replace_result (Callable): Returns a copy of a message with the result at
+            the given position replaced by the given text.
+
+    Returns:
+        List[Dict[str, Any]]: The same list when nothing was elided, otherwise a new one.
+    """
+    first_seen: Dict[bytes, Optional[str]] = {}
+    compacted: Optional[List[Dict[str, Any]]] = None
+    for i, msg in enumerate(messages):
+        results = tool_results(msg)
+        if not results:
+            if msg.get("role") == "user":
+                first_seen.clear()
+            continue
+        for position, tool_call_id, body in results:
+            if len(body) < _MIN_ELIDED_RESULT_CHARS:
+                continue
+            key = hashlib.sha256(body).digest()
+            if key not in first_seen:
+                first_seen[key] = tool_call_id
+                continue
+            if compacted is None:
+                compacted = list(messages)
+            compacted[i] = replace_result(
+                compacted[i],
+                position,
+                f"[elided: identical to the earlier result of tool call {first_seen[key]}]",
+            )
+    return messages if compacted is None else compacted
+
 
 class LLMProviderBase:
     """
@@ -13,6 +113,29 @@ class LLMProviderBase:
     def __init__(self) -> None:
         self.ensure_required_secrets()
 
+    async def startup(self) -> None:
+        """
+        Acquire long-lived resources (e.g. API clients) before the first call.
+
+        No-op in the base class.
+        """
+        pass
+
+    async def aclose(self) -> None:
+        """
+        Release resources acquired by `startup`.
+
+        No-op in the base class.
+        """
+        pass
+
+    async def __aenter__(self) -> "LLMProviderBase":
+        await self.startup()
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.aclose()
+
     @staticmethod
     def _error_response(msg: str) -> Dict[str, str]:
         """
@@ -38,6 +161,18 @@ class LLMProviderBase:
         """
         return False
 
+    def cached_prompt_tokens(self, response: Any) -> int:
+        """
+        Number of prompt tokens served from the provider's prompt cache.
+
+        Args:
+            response (Any): The response object from the LLM.
+
+        Returns:
+            int: Always returns 0 in the base class.
+        """
+        return 0
+
     def handle_token_accounting(self, execution_tokens: Tokens, response: Any) -> LLMTokens:
         """
         Handle the accounting of token usage after LLM execution.
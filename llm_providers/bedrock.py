@@ -4,19 +4,132 @@ Amazon Bedrock model provider implementation – async version using aioboto3.
 Copyright (c) 2025 Xpander, Inc. All rights reserved.
 """
 
+import asyncio
+import hashlib
+import json
 import aioboto3
 from botocore.config import Config
-from os import getenv
-from typing import Dict, Optional, List, Any
+from botocore.exceptions import ClientError, ConnectTimeoutError, ReadTimeoutError
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import AsyncIterator, Dict, Optional, List, Any
 from dotenv import load_dotenv
 import time
 from loguru import logger
 from xpander_sdk import LLMTokens, Tokens
 
-from .base import LLMProviderBase
+from .base import (
+    AI_SAFETY,
+    GENERIC_ERROR,
+    RATE_LIMITED_ERROR,
+    TIMEOUT_ERROR,
+    LLMProviderBase,
+    ToolResultRef,
+    canonical_json,
+    elide_duplicate_tool_results,
+)
+from .config import load_bedrock_config
 
 load_dotenv()
 
+# Marks the end of a reusable prompt prefix for Bedrock prompt caching
+_CACHE_POINT: Dict[str, Any] = {"cachePoint": {"type": "default"}}
+
+# Bedrock toolChoice shapes for "required" and any other tool choice
+_TOOL_CHOICE_ANY: Dict[str, Any] = {"any": {}}
+_TOOL_CHOICE_AUTO: Dict[str, Any] = {"auto": {}}
+
+# Usage reported for responses replayed from the response cache
+_NO_USAGE: Dict[str, int] = {"inputTokens": 0, "outputTokens": 0, "totalTokens": 0}
+
+# Bedrock error code → user-facing message
+_ERROR_MESSAGES: Dict[str, str] = {
+    "ThrottlingException": RATE_LIMITED_ERROR,
+    "TooManyRequestsException": RATE_LIMITED_ERROR,
+    "ServiceUnavailableException": "The model is temporarily unavailable. Please try again later.",
+    "AccessDeniedException": (
+        "Access to the model was denied. Please check your AWS credentials "
+        "and Bedrock model access."
+    ),
+    "ResourceNotFoundException": (
+        "The configured model was not found. "
+        "Please check your BEDROCK_MODEL_ID environment variable."
+    ),
+}
+
+
+def _tool_results(msg: Dict[str, Any]) -> List[ToolResultRef]:
+    """
+    List the toolResult blocks of a Bedrock message.
+
+    Args:
+        msg (Dict[str, Any]): Bedrock conversation message.
+
+    Returns:
+        List[ToolResultRef]: Block index, toolUseId and serialized content per result.
+    """
+    content = msg.get("content")
+    if not isinstance(content, list):
+        return []
+    return [
+        (j, block["toolResult"].get("toolUseId"), canonical_json(block["toolResult"].get("content")))
+        for j, block in enumerate(content)
+        if isinstance(block, dict) and block.get("toolResult")
+    ]
+
+
+def _replace_tool_result(msg: Dict[str, Any], j: int, text: str) -> Dict[str, Any]:
+    """
+    Copy a Bedrock message with the content of its j-th toolResult block replaced.
+
+    Args:
+        msg (Dict[str, Any]): Bedrock conversation message.
+        j (int): Index of the toolResult block.
+        text (str): Replacement text.
+
+    Returns:
+        Dict[str, Any]: The rebuilt message.
+    """
+    content = list(msg["content"])
+    content[j] = {"toolResult": {**content[j]["toolResult"], "content": [{"text": text}]}}
+    return {**msg, "content": content}
+
+
+@lru_cache(maxsize=None)
+def _get_bedrock_session(
+    profile: Optional[str],
+    access_key_id: Optional[str],
+    secret_access_key: Optional[str],
+    session_token: Optional[str],
+) -> aioboto3.Session:
+    """
+    Return a shared aioboto3 session for the given AWS credentials.
+
+    Provider instances created with the same credentials (e.g. one per
+    execution request) reuse a single session instead of resolving
+    credentials again for every construction.
+
+    Args:
+        profile (Optional[str]): AWS profile name; takes precedence over keys.
+        access_key_id (Optional[str]): AWS access key ID.
+        secret_access_key (Optional[str]): AWS secret access key.
+        session_token (Optional[str]): AWS session token, when using roles.
+
+    Returns:
+        aioboto3.Session: Cached session for these credentials.
+    """
+    if profile:
+        return aioboto3.Session(profile_name=profile)
+
+    return aioboto3.Session(
+        aws_access_key_id=access_key_id,
+        aws_secret_access_key=secret_access_key,
+        aws_session_token=session_token or None,
+    )
+
+
 class AsyncBedrockProvider(LLMProviderBase):
     """
     Async Provider for Amazon Bedrock model API interactions.
@@ -29,39 +142,53 @@ class AsyncBedrockProvider(LLMProviderBase):
         AWS_REGION: AWS region for Bedrock.
         BEDROCK_MODEL_ID: Identifier of the model to use.
         MAXIMUM_STEPS_SOFT_LIMIT: Step limit for AI execution safety.
+        BEDROCK_MAX_CONCURRENCY: Maximum in-flight converse requests (default 8).
+        BEDROCK_PROMPT_CACHING: Send prompt cache points, "true" or "false" (default "false"); enable only for models that support prompt caching.
+        BEDROCK_RESPONSE_CACHE_SIZE: Identical temperature-0 requests answered from memory (default 0, off).
+        BEDROCK_STREAMING: Use converse_stream, "true" or "false" (default "false").
         AWS_PROFILE / AWS_ACCESS_KEY_ID / AWS_SECRET_ACCESS_KEY: AWS credentials.
     """
 
     def __init__(self) -> None:
         super()
-        self.model_id = getenv("BEDROCK_MODEL_ID")
-        self.region = getenv("AWS_REGION")
-        self.aws_profile = getenv("AWS_PROFILE")
-        self.aws_session_token = getenv("AWS_SESSION_TOKEN")
-
-        self.ai_safety = (
-            f"If you have reached the maximum number of steps "
-            f"({getenv('MAXIMUM_STEPS_SOFT_LIMIT')}), you must immediately "
-            f"call xpfinish-agent-execution-finished with the final result "
-            f"to complete this task, and provide useful feedback to the user "
-            f"about your progress and suggestions on how to call you again "
-            f"with a smaller task. Do nothing else."
+        cfg = load_bedrock_config()
+        self.model_id = cfg.model_id
+        self.region = cfg.region
+        self.aws_profile = cfg.aws_profile
+        self.aws_session_token = cfg.session_token
+        self.prompt_caching = cfg.prompt_caching
+        self.streaming = cfg.streaming
+
+        self.ai_safety = AI_SAFETY
+        self._safety_block = {"text": self.ai_safety}
+
+        self._default_inference_config = {"temperature": 0.0}
+
+        self._client_cfg = Config(
+            connect_timeout=300,
+            read_timeout=300,
+            tcp_keepalive=True,
+            max_pool_connections=64,
+            retries={"mode": "adaptive", "max_attempts": 3},
         )
 
-        self._client_cfg = Config(connect_timeout=300, read_timeout=300)
+        self._session = _get_bedrock_session(
+            self.aws_profile,
+            cfg.access_key_id,
+            cfg.secret_access_key,
+            self.aws_session_token,
+        )
+
+        self._client_cm = None
+        self._client = None
+        self._concurrency = asyncio.Semaphore(cfg.max_concurrency)
+
+        self._response_cache_size = cfg.response_cache_size
+        self._response_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
 
     def ensure_required_secrets(self):
         # Ensure required secrets
-        required_env_vars: List[str] = [
-            "AWS_REGION",
-            "MAXIMUM_STEPS_SOFT_LIMIT",
-            "MAXIMUM_STEPS_HARD_LIMIT",
-            "BEDROCK_MODEL_ID",
-        ]
-        if not getenv("AWS_PROFILE"):
-            required_env_vars += ["AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY"]
-
-        missing = [v for v in required_env_vars if getenv(v) is None]
+        missing = load_bedrock_config().missing_env_vars()
         if missing:
             raise KeyError(f"Environment variables are missing: {missing}")
 
@@ -71,13 +198,14 @@ class AsyncBedrockProvider(LLMProviderBase):
         messages: List[Dict[str, Any]],
         system_message: Optional[List[Dict[str, str]]] = None,
         temperature: float = 0.0,
-        tools: Optional[List[Dict]] = [],
+        tools: Optional[List[Dict]] = None,
         tool_choice: Optional[str] = "required",
+        prompt_cache_key: Optional[str] = None,
     ) -> Dict[str, Any]:
         """
         Asynchronously invoke the Bedrock model's /converse endpoint.
 
-        Appends AI safety instructions to the system prompt and invokes
+        Adds the AI safety instructions as a system block and invokes
         the model with the specified configuration. Returns the raw Bedrock
         response or an error response on failure.
 
@@ -87,72 +215,182 @@ class AsyncBedrockProvider(LLMProviderBase):
             temperature (float): Temperature setting for the model generation.
             tools (Optional[List[Dict]]): Optional tool configuration for the model.
             tool_choice (Optional[str]): Tool usage policy, default is 'required'.
+            prompt_cache_key (Optional[str]): Unused; accepted for interface parity with OpenAI.
 
         Returns:
             Dict[str, Any]: Bedrock response or standardized error dictionary.
         """
-        start = time.time()
+        start = time.perf_counter()
 
+        # The caller's system message is reused every step, so build a new list
+        # around it rather than mutating it
         if system_message:
-            system_message[0]["text"] = (
-                f"{system_message[0]['text']}\n\n{self.ai_safety}"
-            )
+            system_message = [*system_message, self._safety_block]
+
+        messages = elide_duplicate_tool_results(messages, _tool_results, _replace_tool_result)
+
+        if self.prompt_caching:
+            # The system prompt and the history up to the latest turn are identical
+            # on the next step, so let Bedrock reuse them instead of re-prefilling
+            if system_message:
+                system_message.append(_CACHE_POINT)
+            if messages and isinstance(messages[-1].get("content"), list):
+                last = messages[-1]
+                messages = [*messages[:-1], {**last, "content": [*last["content"], _CACHE_POINT]}]
 
         params: Dict[str, Any] = {
             "modelId": self.model_id,
             "messages": messages,
-            "inferenceConfig": {"temperature": temperature},
+            "inferenceConfig": (
+                self._default_inference_config
+                if temperature == 0.0
+                else {"temperature": temperature}
+            ),
             "toolConfig": {
-                "tools": tools,
-                "toolChoice": {"any": {} if tool_choice == "required" else False},
+                "tools": tools or [],
+                "toolChoice": _TOOL_CHOICE_ANY if tool_choice == "required" else _TOOL_CHOICE_AUTO,
             },
         }
         if system_message:
             params["system"] = system_message
 
-        try:
-            async with self._get_client() as client:
-                resp = await client.converse(**params)
+        cache_key = None
+        if self._response_cache_size and temperature == 0.0:
+            cache_key = hashlib.sha256(canonical_json(params)).hexdigest()
+            cached = self._response_cache.get(cache_key)
+            if cached is not None:
+                self._response_cache.move_to_end(cache_key)
+                logger.info("♻️ Model response served from cache")
+                # Nothing was sent to Bedrock, so nothing is billed for this step
+                return {**cached, "usage": _NO_USAGE}
 
-            elapsed = time.time() - start
-            logger.info(f"🔄 Model response received in {elapsed:.2f} s")
+        try:
+            if self._client is None:
+                await self.startup()
+            async with self._concurrency:
+                if self.streaming:
+                    resp = await self._converse_stream(params, start)
+                else:
+                    resp = await self._client.converse(**params)
+
+            elapsed = time.perf_counter() - start
+            logger.bind(duration_s=elapsed).info("🔄 Model response received in {:.2f} s", elapsed)
+
+            if cache_key is not None:
+                self._response_cache[cache_key] = resp
+                if len(self._response_cache) > self._response_cache_size:
+                    self._response_cache.popitem(last=False)
             return resp
 
-        except Exception as exc:
+        except ClientError as exc:
             logger.error(f"🔴 Error during model invocation: {exc}")
-            msg = str(exc)
+            error = exc.response.get("Error", {})
+            code = error.get("Code")
 
-            if "ValidationException" in msg and "model identifier is invalid" in msg:
+            if code == "ValidationException" and "model identifier is invalid" in error.get("Message", ""):
                 err = (
                     f"The model ID '{self.model_id}' is invalid. "
                     "Please check your BEDROCK_MODEL_ID environment variable."
                 )
             else:
-                err = "An error occurred while invoking the model. Please try again later."
+                err = _ERROR_MESSAGES.get(code, GENERIC_ERROR)
 
             return self._error_response(err)
 
-    def _get_client(self):
+        except (ReadTimeoutError, ConnectTimeoutError) as exc:
+            logger.error(f"🔴 Model invocation timed out: {exc}")
+            return self._error_response(TIMEOUT_ERROR)
+
+        except Exception as exc:
+            logger.error(f"🔴 Error during model invocation: {exc}")
+            return self._error_response(GENERIC_ERROR)
+
+    async def _converse_stream(self, params: Dict[str, Any], start: float) -> Dict[str, Any]:
         """
-        Create an asynchronous aioboto3 client for Bedrock Runtime.
+        Call converse_stream and assemble the events into a converse-shaped response.
+
+        Args:
+            params (Dict[str, Any]): Converse request parameters.
+            start (float): perf_counter timestamp of the request, for first-token logging.
 
         Returns:
-            aioboto3.client: Asynchronous context-managed Bedrock client.
+            Dict[str, Any]: Response with the same output/stopReason/usage keys as converse.
         """
-        if self.aws_profile:
-            session = aioboto3.Session(profile_name=self.aws_profile)
-        else:
-            session = aioboto3.Session(
-                aws_access_key_id=getenv("AWS_ACCESS_KEY_ID"),
-                aws_secret_access_key=getenv("AWS_SECRET_ACCESS_KEY"),
-                aws_session_token=self.aws_session_token or None,
-            )
-
-        return session.client(
+        stream = (await self._client.converse_stream(**params))["stream"]
+
+        blocks: Dict[int, Dict[str, Any]] = {}
+        resp: Dict[str, Any] = {"output": {"message": {"role": "assistant", "content": []}}}
+        first_event = True
+
+        async for event in stream:
+            if first_event:
+                first_event = False
+                logger.opt(lazy=True).info(
+                    "⏱️ First model event after {:.2f} s", lambda: time.perf_counter() - start
+                )
+
+            if "contentBlockStart" in event:
+                begin = event["contentBlockStart"]
+                tool_use = begin["start"].get("toolUse")
+                if tool_use:
+                    blocks[begin["contentBlockIndex"]] = {"toolUse": {**tool_use, "input": ""}}
+
+            elif "contentBlockDelta" in event:
+                delta_event = event["contentBlockDelta"]
+                delta = delta_event["delta"]
+                block = blocks.setdefault(delta_event["contentBlockIndex"], {})
+                if "text" in delta:
+                    block["text"] = block.get("text", "") + delta["text"]
+                elif "toolUse" in delta:
+                    block["toolUse"]["input"] += delta["toolUse"].get("input", "")
+                elif "reasoningContent" in delta:
+                    reasoning = block.setdefault("reasoningContent", {"reasoningText": {"text": ""}})
+                    text = reasoning["reasoningText"]
+                    text["text"] += delta["reasoningContent"].get("text", "")
+                    if "signature" in delta["reasoningContent"]:
+                        text["signature"] = delta["reasoningContent"]["signature"]
+
+            elif "contentBlockStop" in event:
+                block = blocks.get(event["contentBlockStop"]["contentBlockIndex"], {})
+                if "toolUse" in block:
+                    block["toolUse"]["input"] = json.loads(block["toolUse"]["input"] or "{}")
+
+            elif "messageStop" in event:
+                resp["stopReason"] = event["messageStop"]["stopReason"]
+
+            elif "metadata" in event:
+                resp["usage"] = event["metadata"]["usage"]
+                resp["metrics"] = event["metadata"].get("metrics", {})
+
+        resp["output"]["message"]["content"] = [blocks[i] for i in sorted(blocks)]
+        return resp
+
+    async def startup(self) -> None:
+        """
+        Open the Bedrock Runtime client once and keep it for the provider's lifetime.
+
+        Reusing the client keeps the credential resolution, TLS session and
+        aiohttp connection pool warm across `invoke_model` calls.
+        """
+        if self._client is not None:
+            return
+
+        self._client_cm = self._session.client(
             "bedrock-runtime",
             region_name=self.region,
             config=self._client_cfg,
         )
+        self._client = await self._client_cm.__aenter__()
+
+    async def aclose(self) -> None:
+        """
+        Close the Bedrock Runtime client opened by `startup`.
+        """
+        if self._client_cm is None:
+            return
+
+        client_cm, self._client_cm, self._client = self._client_cm, None, None
+        await client_cm.__aexit__(None, None, None)
 
     def should_stop_running(self, response: Dict) -> bool:
         """
@@ -166,6 +404,18 @@ class AsyncBedrockProvider(LLMProviderBase):
         """
         return response.get("status") == "error"
 
+    def cached_prompt_tokens(self, response: Dict) -> int:
+        """
+        Number of prompt tokens Bedrock read from its prompt cache.
+
+        Args:
+            response (Dict): Response dictionary from the model.
+
+        Returns:
+            int: Cached prompt tokens, or 0 when caching is off or the response was replayed.
+        """
+        return response["usage"].get("cacheReadInputTokens") or 0
+
     def handle_token_accounting(self, execution_tokens: Tokens, response: Dict) -> LLMTokens:
         """
         Calculate and accumulate token usage based on model response.
@@ -185,8 +435,51 @@ class AsyncBedrockProvider(LLMProviderBase):
             total_tokens=usage["totalTokens"]
         )
 
-        execution_tokens.worker.completion_tokens += llm_tokens.completion_tokens
-        execution_tokens.worker.prompt_tokens += llm_tokens.prompt_tokens
-        execution_tokens.worker.total_tokens += llm_tokens.total_tokens
+        worker = execution_tokens.worker
+        worker.completion_tokens += llm_tokens.completion_tokens
+        worker.prompt_tokens += llm_tokens.prompt_tokens
+        worker.total_tokens += llm_tokens.total_tokens
 
         return llm_tokens
+
+
+_PROVIDER: ContextVar[AsyncBedrockProvider] = ContextVar("bedrock_provider")
+
+
+def current_bedrock_provider() -> Optional[AsyncBedrockProvider]:
+    """
+    Return the provider shared by the enclosing `bedrock_provider_scope`, if any.
+
+    Returns:
+        Optional[AsyncBedrockProvider]: The scoped provider, or None outside a scope.
+    """
+    return _PROVIDER.get(None)
+
+
+def get_bedrock_provider() -> AsyncBedrockProvider:
+    """
+    Return the scoped Bedrock provider, or a new one when no scope is active.
+
+    Returns:
+        AsyncBedrockProvider: Provider to use for model invocations.
+    """
+    return current_bedrock_provider() or AsyncBedrockProvider()
+
+
+@asynccontextmanager
+async def bedrock_provider_scope() -> AsyncIterator[AsyncBedrockProvider]:
+    """
+    Share one started AsyncBedrockProvider with every coroutine run inside the scope.
+
+    Tasks spawned within the scope inherit the context, so they all reuse
+    the same client and connection pool instead of opening their own.
+
+    Yields:
+        AsyncBedrockProvider: The started, shared provider.
+    """
+    async with AsyncBedrockProvider() as provider:
+        token = _PROVIDER.set(provider)
+        try:
+            yield provider
+        finally:
+            _PROVIDER.reset(token)
@@ -0,0 +1,93 @@
+"""
+Environment-derived configuration for LLM providers.
+
+Copyright (c) 2025 Xpander, Inc. All rights reserved.
+"""
+
+from dataclasses import dataclass
+from functools import lru_cache
+from os import getenv
+from typing import List, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+@dataclass(frozen=True)
+class BedrockConfig:
+    """
+    Resolved Amazon Bedrock settings.
+
+    Attributes:
+        model_id (Optional[str]): Bedrock model identifier (BEDROCK_MODEL_ID).
+        region (Optional[str]): AWS region (AWS_REGION).
+        aws_profile (Optional[str]): AWS profile name (AWS_PROFILE).
+        access_key_id (Optional[str]): AWS access key ID (AWS_ACCESS_KEY_ID).
+        secret_access_key (Optional[str]): AWS secret access key (AWS_SECRET_ACCESS_KEY).
+        session_token (Optional[str]): AWS session token (AWS_SESSION_TOKEN).
+        soft_limit (Optional[str]): Soft step limit (MAXIMUM_STEPS_SOFT_LIMIT).
+        hard_limit (Optional[str]): Hard step limit (MAXIMUM_STEPS_HARD_LIMIT).
+        max_concurrency (int): Maximum in-flight converse requests (BEDROCK_MAX_CONCURRENCY).
+        prompt_caching (bool): Whether to send cache points with converse requests (BEDROCK_PROMPT_CACHING).
+        response_cache_size (int): Deterministic responses kept in memory, 0 disables (BEDROCK_RESPONSE_CACHE_SIZE).
+        streaming (bool): Whether to call converse_stream instead of converse (BEDROCK_STREAMING).
+    """
+
+    model_id: Optional[str]
+    region: Optional[str]
+    aws_profile: Optional[str]
+    access_key_id: Optional[str]
+    secret_access_key: Optional[str]
+    session_token: Optional[str]
+    soft_limit: Optional[str]
+    hard_limit: Optional[str]
+    max_concurrency: int
+    prompt_caching: bool
+    response_cache_size: int
+    streaming: bool
+
+    def missing_env_vars(self) -> List[str]:
+        """
+        List the required environment variables that are not set.
+
+        Returns:
+            List[str]: Names of missing environment variables.
+        """
+        required = {
+            "AWS_REGION": self.region,
+            "MAXIMUM_STEPS_SOFT_LIMIT": self.soft_limit,
+            "MAXIMUM_STEPS_HARD_LIMIT": self.hard_limit,
+            "BEDROCK_MODEL_ID": self.model_id,
+        }
+        missing = [name for name, value in required.items() if value is None]
+        if not self.aws_profile:
+            credentials = {
+                "AWS_ACCESS_KEY_ID": self.access_key_id,
+                "AWS_SECRET_ACCESS_KEY": self.secret_access_key,
+            }
+            missing += [name for name, value in credentials.items() if value is None]
+        return missing
+
+
+@lru_cache(maxsize=1)
+def load_bedrock_config() -> BedrockConfig:
+    """
+    Read the Bedrock settings from the environment once per process.
+
+    Returns:
+        BedrockConfig: The cached configuration.
+    """
+    return BedrockConfig(
+        model_id=getenv("BEDROCK_MODEL_ID"),
+        region=getenv("AWS_REGION"),
+        aws_profile=getenv("AWS_PROFILE"),
+        access_key_id=getenv("AWS_ACCESS_KEY_ID"),
+        secret_access_key=getenv("AWS_SECRET_ACCESS_KEY"),
+        session_token=getenv("AWS_SESSION_TOKEN"),
+        soft_limit=getenv("MAXIMUM_STEPS_SOFT_LIMIT"),
+        hard_limit=getenv("MAXIMUM_STEPS_HARD_LIMIT"),
+        max_concurrency=int(getenv("BEDROCK_MAX_CONCURRENCY", 8)),
+        prompt_caching=getenv("BEDROCK_PROMPT_CACHING", "false").lower() == "true",
+        response_cache_size=int(getenv("BEDROCK_RESPONSE_CACHE_SIZE", 0)),
+        streaming=getenv("BEDROCK_STREAMING", "false").lower() == "true",
+    )
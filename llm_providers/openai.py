@@ -9,14 +9,53 @@ from typing import Dict, Optional, List, Any
 from dotenv import load_dotenv
 import time
 from loguru import logger
-from openai import AsyncOpenAI
-from openai.types.chat import ChatCompletion
+from openai import APITimeoutError, AsyncOpenAI, BadRequestError, NotFoundError, RateLimitError
 from xpander_sdk import LLMTokens, Tokens
 
-from .base import LLMProviderBase
+from .base import (
+    AI_SAFETY,
+    GENERIC_ERROR,
+    RATE_LIMITED_ERROR,
+    TIMEOUT_ERROR,
+    LLMProviderBase,
+    ToolResultRef,
+    elide_duplicate_tool_results,
+)
 
 load_dotenv()
 
+
+def _tool_results(msg: Dict[str, Any]) -> List[ToolResultRef]:
+    """
+    List the tool result carried by a chat message, if any.
+
+    Args:
+        msg (Dict[str, Any]): Chat conversation message.
+
+    Returns:
+        List[ToolResultRef]: The tool_call_id and encoded content of a role=tool message.
+    """
+    content = msg.get("content")
+    if msg.get("role") != "tool" or not isinstance(content, str):
+        return []
+    return [(0, msg.get("tool_call_id"), content.encode())]
+
+
+def _replace_tool_result(msg: Dict[str, Any], _: int, text: str) -> Dict[str, Any]:
+    """
+    Copy a role=tool message with its content replaced.
+
+    Args:
+        msg (Dict[str, Any]): Chat conversation message.
+        _ (int): Unused; a tool message carries a single result.
+        text (str): Replacement text.
+
+    Returns:
+        Dict[str, Any]: The rebuilt message.
+    """
+    return {**msg, "content": text}
+
+
 class AsyncOpenAIProvider(LLMProviderBase):
     """
     Async Provider for OpenAI model API interactions.
@@ -35,15 +74,10 @@ class AsyncOpenAIProvider(LLMProviderBase):
         super()
         self.model_id = getenv("OPENAI_MODEL_ID")
         self.openai_key = getenv("OPENAI_KEY")
+        self._client: Optional[AsyncOpenAI] = None
+        self._safe_system: Optional[tuple] = None
 
-        self.ai_safety = (
-            f"If you have reached the maximum number of steps "
-            f"({getenv('MAXIMUM_STEPS_SOFT_LIMIT')}), you must immediately "
-            f"call xpfinish-agent-execution-finished with the final result "
-            f"to complete this task, and provide useful feedback to the user "
-            f"about your progress and suggestions on how to call you again "
-            f"with a smaller task. Do nothing else."
-        )
+        self.ai_safety = AI_SAFETY
 
     def ensure_required_secrets():
         # Ensure required secrets
@@ -66,13 +100,14 @@ class AsyncOpenAIProvider(LLMProviderBase):
         temperature: float = 0.0,
         tools: Optional[List[Dict]] = None,
         tool_choice: Optional[str] = "required",
+        prompt_cache_key: Optional[str] = None,
     ) -> Dict[str, Any]:
         """
         Asynchronously invoke OpenAI's ChatCompletion API.
 
         Appends a safety instruction to the first system message if present,
-        constructs the request parameters, and returns the raw response from
-        OpenAI or a standardized error on failure.
+        constructs the request parameters, and returns OpenAI's response as a
+        plain dict or a standardized error on failure.
 
         Args:
             messages (List[Dict[str, Any]]): Chat conversation messages.
@@ -80,17 +115,27 @@ class AsyncOpenAIProvider(LLMProviderBase):
             temperature (float): Generation temperature setting.
             tools (Optional[List[Dict]]): Tool calling configurations.
             tool_choice (Optional[str]): Tool selection strategy.
+            prompt_cache_key (Optional[str]): Stable key (e.g. the memory thread ID) that routes
+                every step of a run to the same prompt-cache partition.
 
         Returns:
-            Dict[str, Any]: OpenAI response or an error response dictionary.
+            Dict[str, Any]: OpenAI response (`ChatCompletion.model_dump()`) or an error response dictionary.
         """
-        start = time.time()
-        _messages = messages.copy()
+        start = time.perf_counter()
+
+        # `messages` is the agent's live history: never mutate it, build a new list instead
+        _messages = elide_duplicate_tool_results(messages, _tool_results, _replace_tool_result)
+
+        sys_idx = next((i for i, msg in enumerate(_messages) if msg["role"] == "system"), None)
+        if sys_idx is not None:
+            # Pin the system prompt at index 0: prefix caching only hits when
+            # the request starts with the same bytes on every step
+            _messages = [
+                self._system_with_safety(_messages[sys_idx]),
+                *_messages[:sys_idx],
+                *_messages[sys_idx + 1:],
+            ]
 
-        sys_msg = next((msg for msg in _messages if msg["role"] == "system"), None)
-        if sys_msg:
-            sys_msg["content"] += f"\n\n{self.ai_safety}"
-        
         params: Dict[str, Any] = {
             "model": self.model_id,
             "messages": _messages,
@@ -98,57 +143,136 @@ class AsyncOpenAIProvider(LLMProviderBase):
             "tools": tools,
             "tool_choice": tool_choice,
         }
+        if prompt_cache_key:
+            # Sent via extra_body so older openai clients without the named argument still work
+            params["extra_body"] = {"prompt_cache_key": prompt_cache_key}
 
         try:
             client = self._get_client()
             resp = await client.chat.completions.create(**params)
 
-            elapsed = time.time() - start
-            logger.info(f"🔄 Model response received in {elapsed:.2f} s")
-            return resp
+            elapsed = time.perf_counter() - start
+            logger.bind(duration_s=elapsed).info("🔄 Model response received in {:.2f} s", elapsed)
+            # Dumped once here; the agent loop, token accounting and the SDK all read the dict
+            return resp.model_dump()
 
-        except Exception as exc:
+        except (NotFoundError, BadRequestError) as exc:
             logger.error(f"🔴 Error during model invocation: {exc}")
-            msg = str(exc)
-
-            if "ValidationException" in msg and "model identifier is invalid" in msg:
+            if exc.code == "model_not_found":
                 err = (
                     f"The model ID '{self.model_id}' is invalid. "
-                    "Please check your model environment variable."
+                    "Please check your OPENAI_MODEL_ID environment variable."
                 )
             else:
-                err = "An error occurred while invoking the model. Please try again later."
-
+                err = GENERIC_ERROR
             return self._error_response(err)
 
+        except RateLimitError as exc:
+            logger.error(f"🔴 Model invocation rate limited: {exc}")
+            return self._error_response(RATE_LIMITED_ERROR)
+
+        except APITimeoutError as exc:
+            logger.error(f"🔴 Model invocation timed out: {exc}")
+            return self._error_response(TIMEOUT_ERROR)
+
+        except Exception as exc:
+            logger.error(f"🔴 Error during model invocation: {exc}")
+            return self._error_response(GENERIC_ERROR)
+
+    def _system_with_safety(self, sys_msg: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Return the system message with the safety instruction appended.
+
+        The composed message is reused while the agent's system prompt is unchanged.
+
+        Args:
+            sys_msg (Dict[str, Any]): The agent's system message.
+
+        Returns:
+            Dict[str, Any]: A new system message; `sys_msg` is not modified.
+        """
+        content = sys_msg["content"]
+        if self._safe_system is None or self._safe_system[0] != content:
+            self._safe_system = (content, {**sys_msg, "content": f"{content}\n\n{self.ai_safety}"})
+        return self._safe_system[1]
+
+    async def startup(self) -> None:
+        """
+        Create the OpenAI client before the first call.
+        """
+        self._get_client()
+
+    async def aclose(self) -> None:
+        """
+        Close the OpenAI client and its connection pool.
+        """
+        if self._client is None:
+            return
+
+        client, self._client = self._client, None
+        await client.close()
+
     def _get_client(self) -> AsyncOpenAI:
         """
-        Return an authenticated OpenAI async client.
+        Return the provider's authenticated OpenAI async client, creating it on first use.
+
+        Reusing one client keeps its HTTP connection pool and TLS sessions warm
+        across `invoke_model` calls.
 
         Returns:
             AsyncOpenAI: OpenAI async client instance with configured API key.
         """
-        return AsyncOpenAI(api_key=self.openai_key)
+        if self._client is None:
+            self._client = AsyncOpenAI(api_key=self.openai_key)
+        return self._client
 
-    def handle_token_accounting(self, execution_tokens: Tokens, response: ChatCompletion) -> LLMTokens:
+    def should_stop_running(self, response: Dict) -> bool:
+        """
+        Determine if the execution should stop based on the model response.
+
+        Args:
+            response (Dict): Response dictionary from the model.
+
+        Returns:
+            bool: True if response indicates an error, else False.
+        """
+        return response.get("status") == "error"
+
+    def cached_prompt_tokens(self, response: Dict) -> int:
+        """
+        Number of prompt tokens OpenAI served from its prefix cache.
+
+        Args:
+            response (Dict): OpenAI response dict with token usage.
+
+        Returns:
+            int: Cached prompt tokens, or 0 when the usage payload has no details.
+        """
+        details = response["usage"].get("prompt_tokens_details") or {}
+        return details.get("cached_tokens") or 0
+
+    def handle_token_accounting(self, execution_tokens: Tokens, response: Dict) -> LLMTokens:
         """
         Handle token usage accounting from the OpenAI model response.
 
         Args:
             execution_tokens (Tokens): Execution tracking container.
-            response (ChatCompletion): OpenAI API response with token usage.
+            response (Dict): OpenAI response dict with token usage.
 
         Returns:
             LLMTokens: Structured usage object with prompt, completion, and total tokens.
         """
+        usage = response["usage"]
+
         llm_tokens = LLMTokens(
-            completion_tokens=response.usage.completion_tokens,
-            prompt_tokens=response.usage.prompt_tokens,
-            total_tokens=response.usage.total_tokens,
+            completion_tokens=usage["completion_tokens"],
+            prompt_tokens=usage["prompt_tokens"],
+            total_tokens=usage["total_tokens"],
         )
 
-        execution_tokens.worker.completion_tokens += llm_tokens.completion_tokens
-        execution_tokens.worker.prompt_tokens += llm_tokens.prompt_tokens
-        execution_tokens.worker.total_tokens += llm_tokens.total_tokens
+        worker = execution_tokens.worker
+        worker.completion_tokens += llm_tokens.completion_tokens
+        worker.prompt_tokens += llm_tokens.prompt_tokens
+        worker.total_tokens += llm_tokens.total_tokens
 
         return llm_tokens
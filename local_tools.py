@@ -2,9 +2,14 @@
 Copyright (c) 2025 Xpander, Inc. All rights reserved.
 """
 
+import inspect
 from typing import Dict, Any, Optional
 import sandbox
 
+# Escaped triple quotes the model emits inside Python sources, and their unescaped form
+_ESCAPED_DOCSTRING_QUOTES = '\\"\\"\\"'
+_DOCSTRING_QUOTES = '"""'
+
 # === Local Tool Wrappers ===
 
 def git_clone(repo_url: str, branch: Optional[str] = None) -> Dict[str, Any]:
@@ -41,7 +46,7 @@ def edit_file(file_path: str, content: str) -> Dict[str, Any]:
         Dict[str, Any]: Dictionary with edit status and message.
     """
     if file_path.endswith('.py'):
-        content = content.replace('\\"\\"\\"', '"""')
+        content = content.replace(_ESCAPED_DOCSTRING_QUOTES, _DOCSTRING_QUOTES)
     return sandbox.edit_file(file_path, content)
 
 def new_file(file_path: str, content: str) -> Dict[str, Any]:
@@ -56,7 +61,7 @@ def new_file(file_path: str, content: str) -> Dict[str, Any]:
         Dict[str, Any]: Dictionary with creation status and message.
     """
     if file_path.endswith('.py'):
-        content = content.replace('\\"\\"\\"', '"""')
+        content = content.replace(_ESCAPED_DOCSTRING_QUOTES, _DOCSTRING_QUOTES)
     return sandbox.new_file(file_path, content)
 
 def read_file(file_path: str) -> Dict[str, Any]:
@@ -261,5 +266,18 @@ local_tools = [
 
 ]
 
-local_tools_list = [tool['declaration'] for tool in local_tools]
-local_tools_by_name = {tool['declaration']['function']['name']: tool['fn'] for tool in local_tools}
+local_tools_list = []
+local_tools_by_name = {}
+
+# Parameter names accepted by each local tool, computed once at import
+LOCAL_TOOL_PARAMS: Dict[str, frozenset] = {}
+
+for tool in local_tools:
+    declaration, fn = tool['declaration'], tool['fn']
+    name = declaration['function']['name']
+    local_tools_list.append(declaration)
+    local_tools_by_name[name] = fn
+    LOCAL_TOOL_PARAMS[name] = frozenset(inspect.signature(fn).parameters)
+
+# Side-effect-free tools whose identical calls within one step can share a single run
+LOCAL_TOOL_IDEMPOTENT: frozenset = frozenset({"read_file", "describe_folders_and_files"})
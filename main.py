@@ -5,19 +5,17 @@ Copyright (c) 2025 Xpander, Inc. All rights reserved.
 """
 
 import asyncio
-import json
-from pathlib import Path
+from contextlib import nullcontext
 
-from xpander_sdk import XpanderClient
-from coding_agent import CodingAgent
+try:
+    import uvloop
+except ImportError:  # Not available on Windows → fall back to the default asyncio loop
+    uvloop = None
 
-CONFIG_FILE = Path("xpander_config.json")
-
-
-def load_config() -> dict:
-    if not CONFIG_FILE.exists():
-        raise FileNotFoundError(f"Missing {CONFIG_FILE}")
-    return json.loads(CONFIG_FILE.read_text())
+from xpander_sdk import XpanderClient, LLMProvider
+from coding_agent import CodingAgent, configure_logging, llm_provider
+from llm_providers import bedrock_provider_scope
+from xpander_config import load_config
 
 
 async def interactive_chat(agent):
@@ -25,30 +23,57 @@ async def interactive_chat(agent):
     Opens an interactive terminal chat without ever blocking the event‑loop.
     """
     coding_agent = CodingAgent(agent=agent)
+    await coding_agent.startup()
+
+    try:
+        # First turn (creates the thread)
+        thread_id = await coding_agent.chat("hi")
 
-    # First turn (creates the thread)
-    thread_id = await coding_agent.chat("hi")
-    
-    # Subsequent turns – `input()` is run in a thread so we stay non‑blocking
-    while True:
-        user_input = await asyncio.to_thread(input, "You: ")
-        if user_input == "quit()" or user_input == "q":
-            break
-        await coding_agent.chat(user_input, thread_id)
+        # Subsequent turns – `input()` is run in a thread so we stay non‑blocking
+        while True:
+            try:
+                user_input = await asyncio.to_thread(input, "You: ")
+            except EOFError:  # Ctrl-D / closed stdin → same as quitting
+                break
+            if user_input == "quit()" or user_input == "q":
+                break
+            await coding_agent.chat(user_input, thread_id)
+    finally:
+        await coding_agent.aclose()
 
 
 async def main():
+    # Python 3.12+: tasks that finish without suspending skip a loop iteration
+    if hasattr(asyncio, "eager_task_factory"):
+        asyncio.get_running_loop().set_task_factory(asyncio.eager_task_factory)
+
     cfg = load_config()
 
     # xpander‑sdk APIs are synchronous → run them in a thread to avoid blocking
     xpander = await asyncio.to_thread(XpanderClient, api_key=cfg["api_key"])
     agent = await asyncio.to_thread(xpander.agents.get, agent_id=cfg["agent_id"])
 
-    await interactive_chat(agent)
+    # Share one warm Bedrock client across the whole session
+    provider_scope = (
+        bedrock_provider_scope()
+        if llm_provider == LLMProvider.AMAZON_BEDROCK
+        else nullcontext()
+    )
+    async with provider_scope:
+        await interactive_chat(agent)
 
 
 if __name__ == "__main__":
     """
     Launches the async chat session.
     """
-    asyncio.run(main())
+    configure_logging()
+
+    try:
+        if uvloop is not None:
+            uvloop.run(main())
+        else:
+            asyncio.run(main())
+    except KeyboardInterrupt:
+        # main() was cancelled and its finally blocks already closed the clients
+        pass
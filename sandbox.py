@@ -2,24 +2,199 @@
 Copyright (c) 2025 Xpander, Inc. All rights reserved.
 """
 
+import bisect
+import hashlib
 import os
+import re
 import subprocess
+import tempfile
 import shutil
+import threading
+import uuid
+from contextvars import ContextVar
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, Dict, Any
+from loguru import logger
 
 # === Base Setup ===
 
+_MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+
 # Base directory for sandboxes
-SANDBOX_BASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sandboxes")
+SANDBOX_BASE_DIR = os.path.join(_MODULE_DIR, "sandboxes")
 os.makedirs(SANDBOX_BASE_DIR, exist_ok=True)
-print(f"Sandbox base directory: {SANDBOX_BASE_DIR}")
+_SANDBOX_BASE_PREFIX = SANDBOX_BASE_DIR + os.sep
+
+# Replaced when a thread_id becomes a sandbox directory name, so ids like "../x"
+# cannot point outside SANDBOX_BASE_DIR
+_UNSAFE_THREAD_ID_CHARS = re.compile(r"[^A-Za-z0-9_-]")
 
 # Track sandboxes by thread
 sandboxes = {}  # Map thread_id -> sandbox_path
-current_sandbox = None
+# The last sandbox resolved in this context. A ContextVar rather than a global so
+# concurrent agent executions don't overwrite each other's sandbox; the agent
+# copies its context into the pool threads that run tools
+_current_sandbox: ContextVar[Optional[str]] = ContextVar("current_sandbox", default=None)
+
+# One creation lock per thread_id, so concurrent callers for the same thread can't
+# rmtree the sandbox another one just created, while different threads never wait
+_sandbox_locks: Dict[str, threading.Lock] = {}
+_sandbox_locks_guard = threading.Lock()
+
+# Repositories whose git user identity has already been ensured
+_configured_repos: set = set()
+_configured_repos_lock = threading.Lock()
+
+# Sandbox directories created by this process; trusted without a stat until an
+# operation inside them reports the path missing
+_known_good: set = set()
+
+# Sandbox path -> its symlink-resolved form, for containment checks
+_sandbox_realpaths: Dict[str, str] = {}
+
+# Directory scans fan out over this pool below the repository roots, so the
+# listing latency of independent subtrees overlaps
+_scan_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="scan")
+_SCAN_FAN_OUT_DEPTH = 1
+
+# Sandbox path -> last describe_folders_and_files tree. Writes through edit_file
+# patch it in place; anything else that changes the sandbox drops it. The
+# generation counter stops a scan racing an invalidation from storing a stale tree
+_tree_cache: Dict[str, list] = {}
+_tree_generation: Dict[str, int] = {}
+_tree_cache_lock = threading.Lock()
+
+# O_CLOEXEC keeps the descriptor out of the git subprocesses; Windows lacks it
+_WRITE_FLAGS = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_CLOEXEC", 0) | getattr(os, "O_BINARY", 0)
+
+# Temporary files edit_file writes before moving them into place; a scan that
+# lists one mid-write leaves it out of the tree
+_WRITE_TMP_SUFFIX = re.compile(r"\.tmp\.\d+\.\d+$")
 
 # === Sandbox Management ===
 
+_TRASH_MARKER = ".trash."
+
+def _remove_in_background(*paths: str) -> None:
+    """
+    Delete directory trees on a daemon thread.
+
+    Args:
+        *paths (str): Directories to remove.
+    """
+    def remove():
+        for path in paths:
+            shutil.rmtree(path, ignore_errors=True)
+
+    threading.Thread(target=remove, name="sandbox-trash", daemon=True).start()
+
+def _discard_sandbox_dir(sandbox_path: str) -> None:
+    """
+    Move a stale sandbox out of the way and delete it off the request path.
+
+    The rename is O(1), so the caller can recreate the sandbox immediately;
+    the tree walk happens on a background thread. If the rename fails, the
+    sandbox is removed synchronously as before.
+
+    Args:
+        sandbox_path (str): Sandbox directory to discard.
+    """
+    trash_path = f"{sandbox_path}{_TRASH_MARKER}{uuid.uuid4().hex}"
+    try:
+        os.rename(sandbox_path, trash_path)
+    except OSError:
+        shutil.rmtree(sandbox_path)
+        return
+    _remove_in_background(trash_path)
+
+def _invalidate_tree(sandbox_path: Optional[str] = None) -> None:
+    """
+    Forget the cached tree of a sandbox, or of every sandbox.
+
+    Args:
+        sandbox_path (Optional[str]): Sandbox whose tree changed; None clears all.
+    """
+    with _tree_cache_lock:
+        paths = [sandbox_path] if sandbox_path else list(_tree_cache)
+        for path in paths:
+            _tree_cache.pop(path, None)
+            _tree_generation[path] = _tree_generation.get(path, 0) + 1
+
+def _patch_tree(tree: list, parts: list, rel_prefix: str, size: int) -> Optional[list]:
+    """
+    Return a copy of a cached tree with one file's entry added or resized.
+
+    Only the lists along the file's path are copied, so trees already handed
+    out to callers are never mutated.
+
+    Args:
+        tree (list): Children of the directory being descended.
+        parts (list): Remaining path components of the file.
+        rel_prefix (str): Sandbox-relative path of the directory being descended.
+        size (int): New file size.
+
+    Returns:
+        Optional[list]: The patched children, or None if the cached tree doesn't
+        contain the file's directories and must be rescanned.
+    """
+    name = parts[0]
+    rel_path = f"{rel_prefix}/{name}" if rel_prefix else name
+    names = [node["name"] for node in tree]
+    index = bisect.bisect_left(names, name)
+    found = index < len(tree) and names[index] == name
+    patched = list(tree)
+
+    if len(parts) == 1:
+        node = {"name": name, "type": "file", "path": rel_path, "size": size}
+        if not found:
+            patched.insert(index, node)
+        elif tree[index]["type"] == "file":
+            patched[index] = node
+        else:
+            return None
+        return patched
+
+    if not found or tree[index]["type"] != "directory":
+        return None
+    children = _patch_tree(tree[index]["children"], parts[1:], rel_path, size)
+    if children is None:
+        return None
+    patched[index] = {**tree[index], "children": children}
+    return patched
+
+def _record_file_write(sandbox_path: str, full_path: str, size: int) -> None:
+    """
+    Reflect a file written by edit_file in the sandbox's cached tree.
+
+    Args:
+        sandbox_path (str): Sandbox the file belongs to.
+        full_path (str): Absolute path of the written file.
+        size (int): Size of the written file in bytes.
+    """
+    parts = os.path.relpath(full_path, sandbox_path).split(os.sep)
+    with _tree_cache_lock:
+        # Bumped on every write, so a scan already running when the file
+        # changed never stores its tree
+        _tree_generation[sandbox_path] = _tree_generation.get(sandbox_path, 0) + 1
+        tree = _tree_cache.get(sandbox_path)
+        if tree is None:
+            return
+        patched = _patch_tree(tree, parts, "", size)
+        if patched is None:
+            _tree_cache.pop(sandbox_path, None)
+        else:
+            _tree_cache[sandbox_path] = patched
+
+# Sandboxes trashed by a process that exited before deleting them
+_leftover_trash = []
+with os.scandir(SANDBOX_BASE_DIR) as _buckets:
+    for _bucket in _buckets:
+        if _bucket.is_dir(follow_symlinks=False) and len(_bucket.name) == 2:
+            with os.scandir(_bucket.path) as _it:
+                _leftover_trash += [entry.path for entry in _it if _TRASH_MARKER in entry.name]
+if _leftover_trash:
+    _remove_in_background(*_leftover_trash)
+
 def get_sandbox_path(thread_id: Optional[str] = None) -> str:
     """
     Get or create a sandbox path for the specified thread.
@@ -30,28 +205,69 @@ def get_sandbox_path(thread_id: Optional[str] = None) -> str:
     Returns:
         str: Path to the sandbox directory.
     """
-    global current_sandbox, sandboxes
-
-    if not thread_id and current_sandbox and os.path.exists(current_sandbox):
-        return current_sandbox
+    known = sandboxes.get(thread_id) if thread_id else _current_sandbox.get()
+    if known in _known_good:
+        _current_sandbox.set(known)
+        return known
+
+    with _sandbox_locks_guard:
+        creation_lock = _sandbox_locks.setdefault(thread_id or "", threading.Lock())
+
+    with creation_lock:
+        # Re-check under the lock: another caller may have created it meanwhile
+        existing = sandboxes.get(thread_id) if thread_id else _current_sandbox.get()
+        if existing and os.path.exists(existing):
+            _known_good.add(existing)
+            _current_sandbox.set(existing)
+            return existing
+
+        thread_part = _UNSAFE_THREAD_ID_CHARS.sub("_", thread_id) + "_" if thread_id else ""
+        # Sandboxes live in one of 256 two-hex-digit buckets so the base
+        # directory stays small however many threads have run
+        bucket = hashlib.blake2b(thread_part.encode(), digest_size=1).hexdigest()
+        sandbox_path = f"{_SANDBOX_BASE_PREFIX}{bucket}{os.sep}sandbox_{thread_part}"
+
+        if os.path.exists(sandbox_path):
+            _known_good.discard(sandbox_path)
+            _discard_sandbox_dir(sandbox_path)
+            _invalidate_tree(sandbox_path)
+            # Repositories cloned here later are new and need their identity set again
+            with _configured_repos_lock:
+                _configured_repos.difference_update(
+                    [repo for repo in _configured_repos if repo.startswith(sandbox_path + os.sep)]
+                )
+
+        os.makedirs(sandbox_path, exist_ok=True)
+        _known_good.add(sandbox_path)
+
+        _current_sandbox.set(sandbox_path)
+        if thread_id:
+            sandboxes[thread_id] = sandbox_path
 
-    if thread_id and thread_id in sandboxes and os.path.exists(sandboxes[thread_id]):
-        current_sandbox = sandboxes[thread_id]
-        return current_sandbox
+    return sandbox_path
 
-    thread_part = f"{thread_id}_" if thread_id else ""
-    sandbox_path = os.path.join(SANDBOX_BASE_DIR, f"sandbox_{thread_part}")
+def get_current_sandbox() -> Optional[str]:
+    """
+    Get the sandbox most recently resolved in the current context.
 
-    if os.path.exists(sandbox_path):
-        shutil.rmtree(sandbox_path)
+    Returns:
+        Optional[str]: Sandbox path, or None if none has been resolved yet.
+    """
+    return _current_sandbox.get()
 
-    os.makedirs(sandbox_path, exist_ok=True)
+def _revalidate_sandbox(thread_id: Optional[str] = None) -> None:
+    """
+    Drop a sandbox from the known-good cache if its directory has disappeared.
 
-    current_sandbox = sandbox_path
-    if thread_id:
-        sandboxes[thread_id] = sandbox_path
+    Called after an operation fails with a missing path, so the next
+    get_sandbox_path call re-checks and recreates the sandbox.
 
-    return sandbox_path
+    Args:
+        thread_id (Optional[str]): Identifier for the thread.
+    """
+    path = sandboxes.get(thread_id) if thread_id else _current_sandbox.get()
+    if path and not os.path.isdir(path):
+        _known_good.discard(path)
 
 def get_sandbox(thread_id: Optional[str] = None, filepath: Optional[str] = None) -> str:
     """
@@ -64,11 +280,10 @@ def get_sandbox(thread_id: Optional[str] = None, filepath: Optional[str] = None)
     Returns:
         str: Full sandbox path or full path to file inside sandbox.
     """
-    sandbox_path = get_sandbox_path(thread_id)
-
     if filepath:
+        # safe_path_join resolves the sandbox itself
         return safe_path_join(filepath, thread_id)
-    return sandbox_path
+    return get_sandbox_path(thread_id)
 
 def safe_path_join(filepath: str, thread_id: Optional[str] = None) -> str:
     """
@@ -86,28 +301,95 @@ def safe_path_join(filepath: str, thread_id: Optional[str] = None) -> str:
     if not filepath or filepath.strip() == "":
         return sandbox_path
 
-    if ".." in filepath:
-        print("⚠️ Security: Parent directory traversal blocked")
-        return sandbox_path
-
     full_path = os.path.join(sandbox_path, filepath)
 
+    sandbox_real = _sandbox_realpaths.get(sandbox_path)
+    if sandbox_real is None:
+        sandbox_real = _sandbox_realpaths.setdefault(sandbox_path, os.path.realpath(sandbox_path))
+    if os.path.commonpath([os.path.realpath(full_path), sandbox_real]) != sandbox_real:
+        logger.warning("⚠️ Security: Path outside the sandbox blocked: {}", filepath)
+        return sandbox_path
+
     parent_dir = os.path.dirname(full_path)
-    if parent_dir and not os.path.exists(parent_dir):
-        os.makedirs(parent_dir, exist_ok=True)
+    if parent_dir:
+        # Ensured on every call: checkouts and clones can remove directories
+        # behind our back. Succeeding means a new directory, which changes the tree
+        try:
+            os.makedirs(parent_dir)
+        except FileExistsError:
+            pass
+        else:
+            _invalidate_tree(sandbox_path)
 
     return full_path
 
 # === Git Operations ===
 
-def git_clone(repo_url: str, branch: Optional[str] = None, thread_id: Optional[str] = None) -> Dict[str, Any]:
+# Multiplex SSH connections so successive fetches and pushes to the same host
+# skip the handshake; OpenSSH on Windows has no ControlMaster support
+_GIT_SSH_COMMAND = (
+    "ssh -o ControlMaster=auto -o ControlPersist=10m "
+    f"-o ControlPath={os.path.join(tempfile.gettempdir(), 'agent-ssh-%C')}"
+)
+
+def _git_env() -> Dict[str, str]:
+    """
+    Build the environment for git subprocesses.
+
+    Git must never block waiting on a credential prompt, and read-only commands
+    can skip the optional index refresh and its lock. The rest of the
+    environment is inherited so credential helpers, SSH agents and proxies
+    keep working.
+
+    Returns:
+        Dict[str, str]: Environment mapping for subprocess.run.
+    """
+    return {**os.environ, "GIT_TERMINAL_PROMPT": "0", "GIT_OPTIONAL_LOCKS": "0"}
+
+def _git_remote_env(cwd: str) -> Dict[str, str]:
+    """
+    Build the environment for git subprocesses that talk to a remote.
+
+    Like _git_env, but SSH remotes reuse a persistent master connection unless
+    the user configured their own SSH command. GIT_SSH_COMMAND takes precedence
+    over core.sshCommand, so it is only set when neither the environment nor
+    the git config (system, global or the repository at cwd) names one.
+
+    Args:
+        cwd (str): Directory the git command runs in.
+
+    Returns:
+        Dict[str, str]: Environment mapping for subprocess.run.
+    """
+    env = _git_env()
+    if os.name == "nt" or "GIT_SSH_COMMAND" in env or "GIT_SSH" in env:
+        return env
+    configured = subprocess.run(
+        ["git", "config", "--get", "core.sshCommand"],
+        cwd=cwd, capture_output=True, text=True, env=env
+    )
+    if not configured.stdout.strip():
+        env["GIT_SSH_COMMAND"] = _GIT_SSH_COMMAND
+    return env
+
+def git_clone(
+    repo_url: str,
+    branch: Optional[str] = None,
+    thread_id: Optional[str] = None,
+    depth: Optional[int] = 1,
+) -> Dict[str, Any]:
     """
     Clone a Git repository into the sandbox.
 
+    Clones are shallow and blob-less by default: the agent works on the
+    current files, so history and file contents of other branches are only
+    fetched if they are actually needed.
+
     Args:
         repo_url (str): Repository URL.
         branch (Optional[str]): Branch to checkout.
         thread_id (Optional[str]): Thread identifier.
+        depth (Optional[int]): History depth to fetch; None clones the full history.
 
     Returns:
         Dict[str, Any]: Operation result including success status and messages.
@@ -120,19 +402,28 @@ def git_clone(repo_url: str, branch: Optional[str] = None, thread_id: Optional[s
             target_dir = target_dir[:-4]
 
         target_path = os.path.join(sandbox_path, target_dir)
-        os.makedirs(target_path, exist_ok=True)
 
-        cmd = ["git", "clone", repo_url, "."]
+        # git creates the target directory itself (and removes it again on failure)
+        cmd = ["git", "clone", repo_url, target_dir or ".", "--filter=blob:none"]
+        if depth:
+            cmd.append(f"--depth={depth}")
         if branch:
             cmd.extend(["--branch", branch, "--single-branch"])
-
-        result = subprocess.run(
-            cmd,
-            cwd=target_path,
-            capture_output=True,
-            text=True,
-            timeout=120
-        )
+        elif depth:
+            # --depth implies --single-branch; keep the other branch tips for git_switch_branch
+            cmd.append("--no-single-branch")
+
+        try:
+            result = subprocess.run(
+                cmd,
+                cwd=sandbox_path,
+                capture_output=True,
+                text=True,
+                timeout=120,
+                env=_git_remote_env(sandbox_path)
+            )
+        finally:
+            _invalidate_tree(sandbox_path)
 
         return {
             "success": result.returncode == 0,
@@ -153,6 +444,10 @@ def describe_folders_and_files(thread_id: Optional[str] = None) -> Dict[str, Any
     """
     Return a tree-like structure of the sandbox contents.
 
+    The tree is cached per sandbox and kept current by the sandbox's own
+    write operations, so only the first call after a clone, branch switch or
+    commit walks the file system.
+
     Args:
         thread_id (Optional[str]): Thread identifier.
 
@@ -161,53 +456,125 @@ def describe_folders_and_files(thread_id: Optional[str] = None) -> Dict[str, Any
     """
     sandbox_path = get_sandbox_path(thread_id)
 
-    def build_tree(path: str, rel_path: str = "") -> list:
-        result = []
-        for item in sorted(os.listdir(path)):
-            item_path = os.path.join(path, item)
-            item_rel_path = os.path.join(rel_path, item)
-
-            if os.path.isdir(item_path):
-                children = build_tree(item_path, item_rel_path)
-                result.append({
-                    "name": item,
-                    "type": "directory",
-                    "path": item_rel_path,
-                    "children": children
-                })
-            else:
-                result.append({
-                    "name": item,
-                    "type": "file",
-                    "path": item_rel_path,
-                    "size": os.path.getsize(item_path)
-                })
-        return result
+    def build_tree(path: str, rel_path: str = "", deferred: Optional[list] = None) -> list:
+        # An explicit stack rather than recursion, so deep trees never hit the recursion limit
+        tree: list = []
+        stack = [(path, rel_path, 0, tree)]
+        while stack:
+            dir_path, dir_rel_path, depth, children = stack.pop()
+
+            # scandir hands back type info from the directory listing itself, so
+            # each entry costs at most one stat (for file sizes) instead of three
+            with os.scandir(dir_path) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+
+            for entry in entries:
+                if _WRITE_TMP_SUFFIX.search(entry.name):
+                    continue
+                item_rel_path = f"{dir_rel_path}/{entry.name}" if dir_rel_path else entry.name
+
+                if entry.is_dir(follow_symlinks=False):
+                    node = {
+                        "name": entry.name,
+                        "type": "directory",
+                        "path": item_rel_path,
+                        "children": []
+                    }
+                    if deferred is not None and depth >= _SCAN_FAN_OUT_DEPTH:
+                        # Filled in once the top levels are listed
+                        deferred.append((node, entry.path, item_rel_path))
+                    else:
+                        stack.append((entry.path, item_rel_path, depth + 1, node["children"]))
+                    children.append(node)
+                else:
+                    children.append({
+                        "name": entry.name,
+                        "type": "file",
+                        "path": item_rel_path,
+                        "size": entry.stat(follow_symlinks=False).st_size
+                    })
+        return tree
+
+    with _tree_cache_lock:
+        tree = _tree_cache.get(sandbox_path)
+        generation = _tree_generation.get(sandbox_path, 0)
+    if tree is not None:
+        return {
+            "success": True,
+            "tree": tree
+        }
 
-    tree = build_tree(sandbox_path)
+    deferred: list = []
+    tree = build_tree(sandbox_path, deferred=deferred)
+
+    # Deferred subtrees are walked sequentially inside their worker, so pool
+    # threads never wait on each other
+    if len(deferred) > 1:
+        subtrees = _scan_pool.map(lambda item: build_tree(item[1], item[2]), deferred)
+    else:
+        subtrees = (build_tree(path, rel) for _, path, rel in deferred)
+    for (node, _, _), children in zip(deferred, subtrees):
+        node["children"] = children
+
+    with _tree_cache_lock:
+        if _tree_generation.get(sandbox_path, 0) == generation:
+            _tree_cache[sandbox_path] = tree
 
     return {
         "success": True,
         "tree": tree
     }
 
-def edit_file(file_path: str, content: str, thread_id: Optional[str] = None) -> Dict[str, Any]:
+def edit_file(file_path: str, content: str, thread_id: Optional[str] = None, durable: bool = False) -> Dict[str, Any]:
     """
     Edit a file in the sandbox with the provided content.
 
+    The content is written to a temporary file next to the target and moved
+    into place with os.replace, so a crash mid-write never leaves a partially
+    written file behind.
+
     Args:
         file_path (str): Path to the file inside sandbox.
         content (str): Content to write.
         thread_id (Optional[str]): Thread identifier.
+        durable (bool): Fsync the data before replacing the file.
 
     Returns:
         Dict[str, Any]: Operation result.
     """
+    sandbox_path = get_sandbox_path(thread_id)
     full_path = safe_path_join(file_path, thread_id)
+    # Replace the file a symlink points at, not the link itself
+    is_link = os.path.islink(full_path)
+    target = os.path.realpath(full_path) if is_link else full_path
+    tmp_path = f"{target}.tmp.{os.getpid()}.{threading.get_ident()}"
 
     try:
-        with open(full_path, 'w', encoding='utf-8') as f:
-            f.write(content)
+        try:
+            mode = os.stat(target).st_mode & 0o7777
+        except FileNotFoundError:
+            mode = None
+
+        data = memoryview(content.encode('utf-8'))
+        size = len(data)
+        fd = os.open(tmp_path, _WRITE_FLAGS, 0o666)
+        try:
+            while data:
+                data = data[os.write(fd, data):]
+            if durable:
+                os.fsync(fd)
+        finally:
+            os.close(fd)
+
+        if mode is not None:
+            # Keep the permissions (e.g. the executable bit) of the file being replaced
+            os.chmod(tmp_path, mode)
+        os.replace(tmp_path, target)
+
+        if is_link or full_path == sandbox_path:
+            _invalidate_tree(sandbox_path)
+        else:
+            _record_file_write(sandbox_path, full_path, size)
 
         return {
             "success": True,
@@ -215,6 +582,13 @@ def edit_file(file_path: str, content: str, thread_id: Optional[str] = None) ->
             "filepath": file_path
         }
     except Exception as e:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        _invalidate_tree(sandbox_path)
+        if isinstance(e, FileNotFoundError):
+            _revalidate_sandbox(thread_id)
         return {
             "success": False,
             "message": f"Error editing file: {str(e)}",
@@ -235,36 +609,93 @@ def new_file(file_path: str, content: str, thread_id: Optional[str] = None) -> D
     """
     return edit_file(file_path, content, thread_id)
 
-def read_file(file_path: str, thread_id: Optional[str] = None) -> Dict[str, Any]:
+# Bytes of a binary file shown (hex-encoded) in read_file's result
+_BINARY_PREVIEW_BYTES = 64
+# Leading bytes checked for NUL, git's binary heuristic, before reading the rest
+_BINARY_PROBE_BYTES = 8192
+
+def _binary_file_result(file_path: str, size: int, data: bytes) -> Dict[str, Any]:
+    """
+    Describe a binary file without putting its content into the model context.
+
+    Args:
+        file_path (str): File path as requested.
+        size (int): File size in bytes.
+        data (bytes): Leading bytes of the file.
+
+    Returns:
+        Dict[str, Any]: File read result with an empty content and a short preview.
+    """
+    return {
+        "success": True,
+        "message": f"Binary file, {size} bytes",
+        "filepath": file_path,
+        "content": "",
+        "encoding": "binary",
+        "size": size,
+        "preview": data[:_BINARY_PREVIEW_BYTES].hex(),
+        "truncated": size > _BINARY_PREVIEW_BYTES
+    }
+
+def read_file(file_path: str, thread_id: Optional[str] = None, max_bytes: int = 1 << 20) -> Dict[str, Any]:
     """
     Read the contents of a file in the sandbox.
 
     Args:
         file_path (str): File path to read.
         thread_id (Optional[str]): Thread identifier.
+        max_bytes (int): Maximum number of bytes to read; longer files are truncated.
 
     Returns:
-        Dict[str, Any]: File read result with content.
+        Dict[str, Any]: File read result with content. Files that are not valid
+        UTF-8 are reported as binary with their size and a short hex preview
+        instead of their content.
     """
     full_path = safe_path_join(file_path, thread_id)
 
     try:
-        if not os.path.exists(full_path):
-            return {
-                "success": False,
-                "message": f"File not found: {file_path}",
-                "filepath": file_path,
-                "content": ""
-            }
-
-        with open(full_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+        # Unbuffered: reads go straight into buffers sized from the file
+        with open(full_path, 'rb', buffering=0) as f:
+            size = os.fstat(f.fileno()).st_size
+            wanted = min(size, max_bytes) + 1
+            data = f.read(min(wanted, _BINARY_PROBE_BYTES))
+            if b"\0" in data:
+                # Binary: never read (or decode) more than the probe
+                return _binary_file_result(file_path, size, data)
+            if len(data) < wanted:
+                rest = f.read(wanted - len(data))
+                if rest:
+                    data += rest
+
+        truncated = len(data) > max_bytes
+        if truncated:
+            data = data[:max_bytes]
+
+        try:
+            content = data.decode('utf-8')
+        except UnicodeDecodeError as e:
+            # a cut can land inside a multi-byte character; only treat the
+            # file as binary when the damage isn't just at the truncation boundary
+            if truncated and e.start >= len(data) - 3:
+                content = data[:e.start].decode('utf-8')
+            else:
+                return _binary_file_result(file_path, size, data)
 
         return {
             "success": True,
-            "message": "File read successfully",
+            "message": "File read successfully" if not truncated else f"File truncated to the first {max_bytes} bytes",
             "filepath": file_path,
-            "content": content
+            "content": content,
+            "encoding": "utf-8",
+            "truncated": truncated
+        }
+    except FileNotFoundError:
+        _revalidate_sandbox(thread_id)
+        return {
+            "success": False,
+            "message": f"File not found: {file_path}",
+            "filepath": file_path,
+            "content": ""
         }
     except Exception as e:
         return {
@@ -293,11 +724,12 @@ def commit(message: str, branch_name: str, repository: Optional[str] = None, thr
 
     try:
         # Discover git repositories in sandbox
-        git_dirs = {
-            item: os.path.join(sandbox_path, item)
-            for item in os.listdir(sandbox_path)
-            if os.path.isdir(os.path.join(sandbox_path, item)) and os.path.exists(os.path.join(sandbox_path, item, ".git"))
-        }
+        with os.scandir(sandbox_path) as it:
+            git_dirs = {
+                entry.name: entry.path
+                for entry in sorted(it, key=lambda entry: entry.name)
+                if entry.is_dir(follow_symlinks=False) and os.path.lexists(os.path.join(entry.path, ".git"))
+            }
 
         if not git_dirs:
             return {"success": False, "message": "No Git repositories found in the sandbox."}
@@ -311,45 +743,57 @@ def commit(message: str, branch_name: str, repository: Optional[str] = None, thr
             repo_name = repository
         else:
             repo_name = next(iter(git_dirs))
-            print(f"Warning: No repository specified. Defaulting to '{repo_name}'.")
+            logger.warning("⚠️ No repository specified. Defaulting to '{}'.", repo_name)
 
         repo_path = git_dirs[repo_name]
 
-        # Ensure git user identity is set
-        def ensure_git_config(key: str, value: str):
-            result = subprocess.run(["git", "config", "--get", key], cwd=repo_path, capture_output=True, text=True)
-            if result.returncode != 0 or not result.stdout.strip():
-                subprocess.run(["git", "config", key, value], cwd=repo_path, check=True)
-
-        ensure_git_config("user.name", "AI Agent")
-        ensure_git_config("user.email", "agent@xpander.ai")
+        # Ensure git user identity is set, reading both keys from every config scope at once
+        defaults = {"user.name": "AI Agent", "user.email": "agent@xpander.ai"}
+        with _configured_repos_lock:
+            if repo_path not in _configured_repos:
+                probe = subprocess.run(
+                    ["git", "config", "--get-regexp", r"^user\.(name|email)$"],
+                    cwd=repo_path, capture_output=True, text=True, env=_git_env()
+                )
+                configured = {
+                    key for key, _, value in (line.partition(" ") for line in probe.stdout.splitlines())
+                    if value.strip()
+                }
+                for key, value in defaults.items():
+                    if key not in configured:
+                        subprocess.run(["git", "config", key, value], cwd=repo_path, check=True, env=_git_env())
+                _configured_repos.add(repo_path)
 
         # Check if branch exists
         check_branch = subprocess.run(
             ["git", "rev-parse", "--verify", branch_name],
-            cwd=repo_path, capture_output=True, text=True
+            cwd=repo_path, capture_output=True, text=True, env=_git_env()
         )
 
         if check_branch.returncode == 0:
-            checkout = subprocess.run(["git", "checkout", branch_name], cwd=repo_path, capture_output=True, text=True)
+            checkout = subprocess.run(["git", "checkout", branch_name], cwd=repo_path, capture_output=True, text=True, env=_git_env())
         else:
-            checkout = subprocess.run(["git", "checkout", "-b", branch_name], cwd=repo_path, capture_output=True, text=True)
+            checkout = subprocess.run(["git", "checkout", "-b", branch_name], cwd=repo_path, capture_output=True, text=True, env=_git_env())
 
         if checkout.returncode != 0:
             return {"success": False, "message": f"Failed to checkout/create branch '{branch_name}': {checkout.stderr.strip()}"}
 
         # Stage all changes
-        add = subprocess.run(["git", "add", "."], cwd=repo_path, capture_output=True, text=True)
+        add = subprocess.run(["git", "add", "."], cwd=repo_path, capture_output=True, text=True, env=_git_env())
         if add.returncode != 0:
             return {"success": False, "message": f"Failed to stage files: {add.stderr.strip()}"}
 
         # Commit
-        commit = subprocess.run(["git", "commit", "-m", message], cwd=repo_path, capture_output=True, text=True)
+        commit = subprocess.run(["git", "commit", "-m", message], cwd=repo_path, capture_output=True, text=True, env=_git_env())
         if commit.returncode != 0:
             return {"success": False, "message": f"Commit failed: {commit.stderr.strip()}"}
 
         # Push
-        push = subprocess.run(["git", "push", "-u", "origin", branch_name], cwd=repo_path, capture_output=True, text=True)
+        push = subprocess.run(["git", "push", "-u", "origin", branch_name], cwd=repo_path, capture_output=True, text=True, env=_git_remote_env(repo_path))
+        if push.returncode != 0 and "shallow" in push.stderr:
+            # Remote refused a push from the shallow clone → fetch the full history once and retry
+            subprocess.run(["git", "fetch", "--unshallow"], cwd=repo_path, capture_output=True, text=True, env=_git_remote_env(repo_path))
+            push = subprocess.run(["git", "push", "-u", "origin", branch_name], cwd=repo_path, capture_output=True, text=True, env=_git_remote_env(repo_path))
         if push.returncode != 0:
             return {"success": False, "message": f"Push failed: {push.stderr.strip()}"}
 
@@ -363,6 +807,9 @@ def commit(message: str, branch_name: str, repository: Optional[str] = None, thr
 
     except Exception as e:
         return {"success": False, "message": f"Unexpected error: {str(e)}"}
+    finally:
+        # The tree includes .git directories, which any of the steps above may change
+        _invalidate_tree(sandbox_path)
 
 def git_switch_branch(branch: str, path: Optional[str] = None, thread_id: Optional[str] = None) -> Dict[str, Any]:
     """
@@ -390,7 +837,8 @@ def git_switch_branch(branch: str, path: Optional[str] = None, thread_id: Option
             cwd=sandbox_path,
             capture_output=True,
             text=True,
-            timeout=60
+            timeout=60,
+            env=_git_remote_env(sandbox_path)
         )
         if fetch_result.returncode != 0:
             return {
@@ -403,7 +851,8 @@ def git_switch_branch(branch: str, path: Optional[str] = None, thread_id: Option
             cwd=sandbox_path,
             capture_output=True,
             text=True,
-            timeout=60
+            timeout=60,
+            env=_git_env()
         )
 
         return {
@@ -416,3 +865,6 @@ def git_switch_branch(branch: str, path: Optional[str] = None, thread_id: Option
             "success": False,
             "message": f"Error switching branch: {str(e)}"
         }
+    finally:
+        # `path` may point at any sandbox, so drop every cached tree
+        _invalidate_tree()
@@ -0,0 +1,64 @@
+"""
+Copyright (c) 2025 Xpander, Inc. All rights reserved.
+"""
+
+import contextlib
+import os
+import shutil
+import uuid
+
+import pytest
+
+import sandbox
+
+
+@pytest.fixture
+def thread_id():
+    thread_id = f"test-{uuid.uuid4().hex}"
+    yield thread_id
+    sandbox_path = sandbox.sandboxes.pop(thread_id, None)
+    if sandbox_path:
+        sandbox._invalidate_tree(sandbox_path)
+        shutil.rmtree(sandbox_path, ignore_errors=True)
+
+
+def _file_paths(tree: list) -> list:
+    paths = []
+    for node in tree:
+        if node["type"] == "file":
+            paths.append(node["path"])
+        else:
+            paths.extend(_file_paths(node["children"]))
+    return paths
+
+
+def test_write_during_scan_is_not_lost_from_cached_tree(thread_id, monkeypatch):
+    sandbox.edit_file("a.txt", "a", thread_id)
+    sandbox_path = sandbox.get_sandbox_path(thread_id)
+    real_scandir = os.scandir
+    written = []
+
+    def scandir_then_write(path):
+        # List the directory first, then write, as a concurrent edit_file would
+        with real_scandir(path) as it:
+            entries = list(it)
+        if path == sandbox_path and not written:
+            written.append(sandbox.edit_file("b.txt", "b", thread_id))
+        return contextlib.nullcontext(entries)
+
+    monkeypatch.setattr(sandbox.os, "scandir", scandir_then_write)
+    stale = sandbox.describe_folders_and_files(thread_id)
+    monkeypatch.undo()
+
+    assert written and written[0]["success"]
+    assert _file_paths(stale["tree"]) == ["a.txt"]
+    assert _file_paths(sandbox.describe_folders_and_files(thread_id)["tree"]) == ["a.txt", "b.txt"]
+
+
+def test_scan_skips_in_flight_write_temp_files(thread_id):
+    sandbox.edit_file("a.txt", "a", thread_id)
+    sandbox_path = sandbox.get_sandbox_path(thread_id)
+    with open(os.path.join(sandbox_path, f"a.txt.tmp.{os.getpid()}.1"), "w") as f:
+        f.write("partial")
+
+    assert _file_paths(sandbox.describe_folders_and_files(thread_id)["tree"]) == ["a.txt"]
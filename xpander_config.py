@@ -0,0 +1,25 @@
+"""
+Shared loader for xpander_config.json
+
+Copyright (c) 2025 Xpander, Inc. All rights reserved.
+"""
+
+import json
+from functools import lru_cache
+from pathlib import Path
+
+CONFIG_FILE = Path("xpander_config.json")
+
+
+@lru_cache(maxsize=1)
+def load_config() -> dict:
+    """
+    Read and parse xpander_config.json once per process.
+
+    Returns:
+        dict: The parsed configuration.
+    """
+    try:
+        return json.loads(CONFIG_FILE.read_bytes())
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Missing {CONFIG_FILE}") from None
@@ -5,8 +5,9 @@ Copyright (c) 2025 Xpander, Inc. All rights reserved.
 """
 
 import asyncio
-import json
-from pathlib import Path
+import atexit
+from concurrent.futures import ThreadPoolExecutor
+from os import getenv
 from loguru import logger
 
 from xpander_utils.events import (
@@ -16,20 +17,50 @@ from xpander_utils.events import (
     ExecutionStatus,
 )
 from xpander_sdk import XpanderClient
-from coding_agent import CodingAgent
+from coding_agent import SDK_LOCK, CodingAgent, configure_logging
+from xpander_config import load_config
+
+configure_logging()
 
 # Configuration & SDK setup (sync → thread‑offloaded where needed)
 
-CFG_PATH = Path("xpander_config.json")
-if not CFG_PATH.exists():
-    raise FileNotFoundError("Missing xpander_config.json")
+xpander_cfg: dict = load_config()
+AGENT_ID: str = xpander_cfg["agent_id"]
 
-xpander_cfg: dict = json.loads(CFG_PATH.read_text())
+# No event loop is running at import time, so the blocking constructor can
+# run directly instead of spinning up a throwaway loop just to offload it
+xpander: XpanderClient = XpanderClient(api_key=xpander_cfg["api_key"])
 
-# xpander‑sdk is blocking; create the client in a worker thread
-xpander: XpanderClient = asyncio.run(
-    asyncio.to_thread(XpanderClient, api_key=xpander_cfg["api_key"])
+# Blocking SDK calls run on a dedicated, bounded pool rather than the loop's
+# shared default executor, so bursts of events queue here instead of starving
+# other to_thread users
+_sdk_pool = ThreadPoolExecutor(
+    max_workers=int(getenv("XPANDER_WORKERS", 8)),
+    thread_name_prefix="xpander-sdk",
 )
+atexit.register(_sdk_pool.shutdown, wait=False)
+
+
+def _in_sdk_pool(fn, *args, **kwargs) -> asyncio.Future:
+    """
+    Run a blocking SDK call on the handler's thread pool.
+
+    The call holds SDK_LOCK, so it never overlaps SDK calls made by running
+    executions.
+
+    Args:
+        fn: Callable to run.
+        *args: Positional arguments for `fn`.
+        **kwargs: Keyword arguments for `fn`.
+
+    Returns:
+        asyncio.Future: Awaitable resolving to the callable's return value.
+    """
+    def locked():
+        with SDK_LOCK:
+            return fn(*args, **kwargs)
+
+    return asyncio.get_running_loop().run_in_executor(_sdk_pool, locked)
 
 # Async execution handler
 async def on_execution_request(execution_task: AgentExecution) -> AgentExecutionResult:
@@ -39,17 +70,27 @@ async def on_execution_request(execution_task: AgentExecution) -> AgentExecution
     """
 
     try:
-        # --- fetch agent object (blocking → thread) -------------------
-        agent = await asyncio.to_thread(
-            xpander.agents.get, agent_id=xpander_cfg["agent_id"]
+        # --- fetch a fresh agent object per request (blocking → thread)
+        # A reused Agent would keep the previous request's execution memory
+        agent = await _in_sdk_pool(
+            xpander.agents.get, agent_id=AGENT_ID
         )
 
         # initialise task metadata (also blocking)
-        await asyncio.to_thread(agent.init_task, execution=execution_task.model_dump())
+        await _in_sdk_pool(agent.init_task, execution=execution_task.model_dump())
 
         # --- run the CodingAgent -------------------------------------
-        coding_agent = CodingAgent(agent=agent)
-        exec_status = await coding_agent._agent_loop()   # returns ExecutionResult
+        # The constructor takes SDK_LOCK itself, so it runs on the pool unlocked
+        coding_agent = await asyncio.get_running_loop().run_in_executor(
+            _sdk_pool, lambda: CodingAgent(agent=agent)
+        )
+        await coding_agent.startup()
+        try:
+            exec_status = await coding_agent._agent_loop()   # returns ExecutionResult
+        finally:
+            await coding_agent.aclose()
+
+        result, status = await _in_sdk_pool(lambda: (exec_status.result, exec_status.status))
 
     except Exception as exc:
         # --------------------------------------------------------------
@@ -62,8 +103,8 @@ async def on_execution_request(execution_task: AgentExecution) -> AgentExecution
 
     # ---------------- normal completion ------------------------------
     return AgentExecutionResult(
-        result=exec_status.result,
-        is_success=exec_status.status == ExecutionStatus.COMPLETED,
+        result=result,
+        is_success=status == ExecutionStatus.COMPLETED,
     )
 
 